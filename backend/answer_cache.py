@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from cache import LRUCache
+from config import (
+    ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC, ANSWER_CACHE_EMBED_MODEL,
+    ANSWER_CACHE_SIMILARITY
+)
+
+logger = logging.getLogger(__name__)
+
+# Farmer context fields that change the advice for a generic question
+CONTEXT_KEY_FIELDS = ("crop_type", "soil_type", "farming_method", "symptoms")
+
+
+def normalize_text(text):
+    """Case-folded text without punctuation and repeated whitespace.
+
+    Punctuation is dropped by Unicode category so Devanagari vowel signs are
+    kept while the danda is removed.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split())
+
+
+def context_scope(context, language):
+    """Language plus the canonical context fields, as a stable string."""
+    context = context if isinstance(context, dict) else {}
+    fields = [normalize_text(context.get(field)) for field in CONTEXT_KEY_FIELDS]
+    return json.dumps([language] + fields, ensure_ascii=False)
+
+
+class AnswerCache:
+    """Chatbot answers keyed on the normalized question and farmer context.
+
+    Answers are stored per language, already translated, so a hit skips the
+    LLM and both translation passes. Exact lookups hash the normalized
+    question; with ``semantic`` enabled a miss falls back to the most similar
+    cached question (by embedding cosine similarity) in the same language and
+    context, if it reaches ``threshold``.
+    """
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, semantic=ANSWER_CACHE_SEMANTIC,
+                 threshold=ANSWER_CACHE_SIMILARITY, embeddings=None):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.semantic = semantic and maxsize > 0
+        self.threshold = threshold
+        self._embeddings = embeddings
+        # key -> (scope, unit vector), bounded like the answers themselves
+        self._index = OrderedDict()
+        self.semantic_hits = 0
+        self.embedding_errors = 0
+
+    @property
+    def enabled(self):
+        return self.memory.maxsize > 0
+
+    def key_for(self, question, scope):
+        digest = hashlib.sha256(f"{scope}\n{normalize_text(question)}".encode("utf-8")).hexdigest()
+        return f"answer:{digest}"
+
+    async def get(self, question, context, language):
+        """Return the cached entry dict (answer, question_en, answer_en) or None."""
+        if not self.enabled:
+            return None
+        scope = context_scope(context, language)
+        entry = self.memory.get(self.key_for(question, scope))
+        if entry is not None or not self.semantic:
+            return entry
+        vector = await self._embed(question)
+        if vector is None:
+            return None
+        key, similarity = self._nearest(scope, vector)
+        if key is None or similarity < self.threshold:
+            return None
+        entry = self.memory.get(key)
+        if entry is None:
+            # Expired or evicted since it was indexed
+            self._index.pop(key, None)
+            return None
+        self.semantic_hits += 1
+        logger.info(f"Semantic answer cache hit (similarity {similarity:.3f})")
+        return entry
+
+    async def set(self, question, context, language, answer, question_en, answer_en):
+        if not self.enabled:
+            return
+        scope = context_scope(context, language)
+        key = self.key_for(question, scope)
+        self.memory.set(key, {"answer": answer, "question_en": question_en, "answer_en": answer_en})
+        if not self.semantic:
+            return
+        vector = await self._embed(question)
+        if vector is not None:
+            self._index[key] = (scope, vector)
+            self._index.move_to_end(key)
+            while len(self._index) > self.memory.maxsize:
+                self._index.popitem(last=False)
+
+    def _nearest(self, scope, vector):
+        keys = [key for key, (s, _) in self._index.items() if s == scope]
+        if not keys:
+            return None, 0.0
+        matrix = np.stack([self._index[key][1] for key in keys])
+        similarities = matrix @ vector
+        best = int(similarities.argmax())
+        return keys[best], float(similarities[best])
+
+    async def _embed(self, text):
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            self._embeddings = OllamaEmbeddings(model=ANSWER_CACHE_EMBED_MODEL)
+        try:
+            vector = np.asarray(await self._embeddings.aembed_query(normalize_text(text)), dtype=np.float32)
+        except Exception as e:
+            self.embedding_errors += 1
+            logger.error(f"Failed to embed question for the answer cache: {str(e)}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def stats(self):
+        return dict(
+            self.memory.stats(),
+            semantic=self.semantic,
+            threshold=self.threshold,
+            indexed=len(self._index),
+            semantic_hits=self.semantic_hits,
+            embedding_errors=self.embedding_errors,
+        )
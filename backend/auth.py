@@ -0,0 +1,127 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from config import (
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_DEPTH, SESSION_SECRET, SESSION_TTL_SECONDS,
+    REQUIRE_SESSION_TOKEN
+)
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HasherBusyError(Exception):
+    """Raised when too many password checks are already waiting for a thread."""
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a dedicated, bounded thread pool.
+
+    bcrypt is deliberately slow and releases the GIL, so running it on its own
+    pool keeps the event loop responsive and lets logins use several cores.
+    At most ``max_pending`` calls may be queued or running at once.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_QUEUE_DEPTH, context=pwd_context):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.context = context
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self.rejected = 0
+        self.latency = LatencyStats()
+
+    async def hash(self, password):
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password, hashed):
+        return await self._run(self.context.verify, password, hashed)
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusyError("Too many password checks in progress")
+        self._pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+            self.latency.record(time.perf_counter() - start)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "latency": self.latency.stats(),
+        }
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SessionTokens:
+    """Stateless session tokens: ``<payload>.<HMAC-SHA256 signature>``.
+
+    The payload carries the farmer's aadhar and an expiry, so verifying a
+    token is one HMAC and needs neither the database nor bcrypt.
+    """
+
+    def __init__(self, secret=SESSION_SECRET, ttl=SESSION_TTL_SECONDS, required=REQUIRE_SESSION_TOKEN):
+        if not secret:
+            if required:
+                # A per-process secret would make tokens fail at random across workers
+                raise RuntimeError("SESSION_SECRET must be set when REQUIRE_SESSION_TOKEN is enabled")
+            logger.warning("SESSION_SECRET is not set; session tokens are only valid until restart")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode("utf-8")
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, aadhar):
+        claims = {"sub": aadhar, "exp": int(time.time()) + self.ttl}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token):
+        """Return the aadhar in a valid, unexpired token, otherwise None."""
+        try:
+            payload, signature = token.split(".")
+            # Compare bytes: compare_digest rejects non-ASCII str with TypeError
+            if not hmac.compare_digest(signature.encode("utf-8"), self._sign(payload).encode("ascii")):
+                return None
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, TypeError, UnicodeError):
+            return None
+        if not isinstance(claims, dict):
+            return None
+        if claims.get("exp", 0) < time.time():
+            return None
+        return claims.get("sub")
+
+
+password_hasher = PasswordHasher()
+session_tokens = SessionTokens()
@@ -0,0 +1,167 @@
+import logging
+import os
+
+import numpy as np
+import torch
+
+from config import DETECT_ONNX_DIR, DETECT_NUM_THREADS
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+class InferenceBackend:
+    """Common interface for running the classifier on a preprocessed batch."""
+
+    name = None
+
+    def __init__(self, id2label):
+        self.id2label = id2label
+
+    def logits(self, pixel_values):
+        """Return float32 logits of shape (N, num_labels) as a NumPy array."""
+        raise NotImplementedError
+
+    def weight_bytes(self):
+        """Size of the weights this backend keeps in memory."""
+        raise NotImplementedError
+
+
+def _tensor_bytes(value):
+    # Quantized modules keep their packed weights as tuples in the state dict
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    return 0
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def __init__(self, model, num_threads=DETECT_NUM_THREADS):
+        super().__init__(model.config.id2label)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model = model.eval()
+
+    def logits(self, pixel_values):
+        with torch.inference_mode():
+            return self.model(pixel_values=torch.as_tensor(pixel_values)).logits.numpy()
+
+    def weight_bytes(self):
+        return sum(_tensor_bytes(value) for value in self.model.state_dict().values())
+
+
+class TorchInt8Backend(TorchBackend):
+    """Dynamic int8 quantization of the model's Linear layers.
+
+    Dynamic quantization in PyTorch only covers Linear/RNN modules, so for
+    MobileNetV2 this shrinks the classifier head while the convolutions stay
+    fp32; use onnx-int8 to quantize the convolutions as well.
+    """
+
+    name = "torch-int8"
+
+    def __init__(self, model):
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model.eval(), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(quantized)
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU session, exported from the PyTorch model on first use."""
+
+    name = "onnx"
+
+    def __init__(self, model, model_name, quantize=False, onnx_dir=DETECT_ONNX_DIR,
+                 num_threads=DETECT_NUM_THREADS):
+        super().__init__(model.config.id2label)
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed; pip install onnxruntime")
+        if quantize:
+            self.name = "onnx-int8"
+        path = export_onnx(model, model_name, onnx_dir)
+        if quantize:
+            path = quantize_onnx(path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.path = path
+
+    def logits(self, pixel_values):
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.numpy()
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        return self.session.run(None, {self.input_name: pixel_values})[0]
+
+    def weight_bytes(self):
+        # ONNX Runtime holds the initializers of the model file
+        return os.path.getsize(self.path)
+
+
+def _onnx_path(model_name, onnx_dir):
+    return os.path.join(onnx_dir, model_name.replace("/", "__") + ".onnx")
+
+
+def export_onnx(model, model_name, onnx_dir=DETECT_ONNX_DIR):
+    """Export the classifier to ONNX with a dynamic batch axis (cached on disk)."""
+    path = _onnx_path(model_name, onnx_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(onnx_dir, exist_ok=True)
+    size = getattr(model.config, "image_size", 224)
+    dummy = torch.zeros(1, model.config.num_channels, size, size)
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, pixel_values):
+            return self.wrapped(pixel_values=pixel_values).logits
+
+    torch.onnx.export(
+        LogitsOnly(model.eval()),
+        (dummy,),
+        path,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17
+    )
+    logger.info(f"Exported {model_name} to {path}")
+    return path
+
+
+def quantize_onnx(path):
+    """Write a dynamically int8-quantized copy of an ONNX model next to it."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = path[:-len(".onnx")] + ".int8.onnx"
+    if not os.path.exists(quantized_path):
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QUInt8)
+        logger.info(f"Quantized {path} to {quantized_path}")
+    return quantized_path
+
+
+def create_backend(kind, model, model_name):
+    """Build the inference backend named by ``kind`` (see BACKENDS)."""
+    if kind == "torch":
+        return TorchBackend(model)
+    if kind == "torch-int8":
+        return TorchInt8Backend(model)
+    if kind == "onnx":
+        return OnnxBackend(model, model_name)
+    if kind == "onnx-int8":
+        return OnnxBackend(model, model_name, quantize=True)
+    raise RuntimeError(f"Unknown detection backend '{kind}', expected one of {', '.join(BACKENDS)}")
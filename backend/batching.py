@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is at its configured depth."""
+
+
+class BatchScheduler:
+    """Collects single items from async callers and runs them in batches.
+
+    Items wait for at most ``max_wait_ms`` (or until ``max_batch_size`` items
+    are queued), then ``run_batch(items)`` is called once on a worker thread
+    and its results are handed back to the waiting callers in order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=10.0, max_queue_depth=64):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch")
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    def free_slots(self):
+        """Number of items that can still be queued before submit is rejected."""
+        if self._queue is None:
+            return 0
+        return self.max_queue_depth - self._queue.qsize()
+
+    async def submit(self, item):
+        """Queue one item and wait for its result."""
+        if self._worker is None:
+            raise RuntimeError("BatchScheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError("Detection queue is full")
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (client disconnects) don't need a forward pass
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.run_batch, items)
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "busy_seconds": self.busy_seconds,
+        }
@@ -0,0 +1,431 @@
+"""Benchmarks and parity checks for the backend hot paths.
+
+Run from the backend directory, for example:
+
+    python benchmark.py parity --images ../imagess
+    python benchmark.py preprocess --images ../imagess --batch 16
+    python benchmark.py backends --images path/to/labelled_folder
+    python benchmark.py translate --pair en-hi
+    python benchmark.py translator   (needs the translation service on port 8100)
+    python benchmark.py loadtest --aadhar 123412341234   (needs the API on port 8000)
+    python benchmark.py login --workers 1 2 4 8
+    python benchmark.py database --writers 4 --readers 8
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "imagess")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def list_images(image_dir):
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    if not paths:
+        sys.exit(f"No images found in {image_dir}")
+    return paths
+
+
+def report(label, seconds, count):
+    print(f"{label:<32} {seconds * 1000:9.2f} ms total  {seconds * 1000 / count:8.3f} ms/image  "
+          f"{count / seconds:9.1f} images/s")
+
+
+def cmd_parity(args):
+    """Compare FastPreprocessor output with the Hugging Face processor."""
+    from detect import FastPreprocessor, load_model_and_processor, preprocess_image
+    from config import DETECT_MODEL_NAME
+
+    processor, _ = load_model_and_processor(DETECT_MODEL_NAME)
+    if processor is None:
+        sys.exit("Failed to load processor")
+    exact = FastPreprocessor.from_processor(processor, jpeg_draft=False)
+    draft = FastPreprocessor.from_processor(processor, jpeg_draft=True)
+
+    failed = False
+    for path in list_images(args.images):
+        reference = preprocess_image(path, processor)["pixel_values"].numpy()
+        exact_diff = np.abs(exact([path]).numpy() - reference)
+        draft_diff = np.abs(draft([path]).numpy() - reference)
+        ok = exact_diff.max() <= args.tolerance and draft_diff.mean() <= args.draft_tolerance
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {os.path.basename(path)}: "
+              f"max|diff| {exact_diff.max():.2e} (no draft), "
+              f"mean|diff| {draft_diff.mean():.2e} (draft)")
+    if failed:
+        sys.exit(1)
+
+
+def cmd_preprocess(args):
+    """Time per-image AutoImageProcessor calls against the batched fast path."""
+    from detect import FastPreprocessor, load_model_and_processor
+    from config import DETECT_MODEL_NAME
+    from PIL import Image
+
+    processor, _ = load_model_and_processor(DETECT_MODEL_NAME)
+    if processor is None:
+        sys.exit("Failed to load processor")
+    paths = list_images(args.images)
+    blobs = [open(path, "rb").read() for path in paths]
+    blobs = (blobs * (args.batch // len(blobs) + 1))[:args.batch]
+
+    exact = FastPreprocessor.from_processor(processor, jpeg_draft=False)
+    draft = FastPreprocessor.from_processor(processor, jpeg_draft=True)
+
+    def hf_path():
+        for blob in blobs:
+            processor(images=Image.open(io.BytesIO(blob)).convert("RGB"), return_tensors="pt")
+
+    for label, fn in [
+        ("AutoImageProcessor (per image)", hf_path),
+        ("FastPreprocessor (no draft)", lambda: exact(blobs)),
+        ("FastPreprocessor (draft)", lambda: draft(blobs)),
+    ]:
+        fn()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        report(label, (time.perf_counter() - start) / args.repeat, len(blobs))
+
+
+def cmd_backends(args):
+    """Accuracy drift and latency/throughput of each detection backend.
+
+    ``--images`` may be a labelled folder (one sub-directory per id2label
+    name); accuracy is then reported alongside agreement with fp32 torch.
+    """
+    from backends import create_backend
+    from detect import FastPreprocessor, load_model_and_processor, predict_batch
+    from config import DETECT_MODEL_NAME
+
+    processor, model = load_model_and_processor(DETECT_MODEL_NAME)
+    if processor is None:
+        sys.exit("Failed to load model")
+    model.eval()
+    preprocessor = FastPreprocessor.from_processor(processor)
+    paths = list_images(args.images)
+    labels = [os.path.basename(os.path.dirname(path)) for path in paths]
+    known = set(model.config.id2label.values())
+    labelled = all(label in known for label in labels)
+    pixel_values = preprocessor(paths)
+
+    reference = None
+    for kind in args.backends:
+        try:
+            backend = create_backend(kind, model, DETECT_MODEL_NAME)
+        except Exception as e:
+            print(f"{kind:<12} unavailable: {e}")
+            continue
+        predictions = [label for label, _ in predict_batch(pixel_values, backend)]
+        logits = backend.logits(pixel_values)
+        if reference is None:
+            reference = (predictions, logits)
+        agreement = np.mean([a == b for a, b in zip(predictions, reference[0])])
+        drift = np.abs(logits - reference[1]).max()
+        accuracy = np.mean([p == t for p, t in zip(predictions, labels)]) if labelled else None
+        print(f"{kind:<12} top-1 agreement {agreement:6.1%}  max|logit drift| {drift:.3e}"
+              + (f"  accuracy {accuracy:6.1%}" if accuracy is not None else ""))
+
+        for batch_size in (1, args.batch):
+            batch = pixel_values[[i % len(paths) for i in range(batch_size)]]
+            backend.logits(batch)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                backend.logits(batch)
+            report(f"  {kind} batch={batch_size}", (time.perf_counter() - start) / args.repeat, batch_size)
+
+
+SAMPLE_SENTENCES = [
+    "Yellowing of the lower leaves is often caused by nitrogen deficiency.",
+    "Remove and destroy the infected leaves to stop the spread of the disease.",
+    "Spray a neem oil solution every seven days in the early morning.",
+    "Avoid overhead irrigation because wet leaves encourage fungal growth.",
+    "Rotate tomatoes with cereals or legumes for at least two seasons.",
+]
+
+
+def sample_answer(sentence_count):
+    sentences = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] + f" ({i + 1})" for i in range(sentence_count)]
+    # A paragraph followed by a bullet list, like typical chatbot answers
+    head, tail = sentences[:max(1, sentence_count // 2)], sentences[max(1, sentence_count // 2):]
+    return " ".join(head) + "".join(f"\n- {s}" for s in tail)
+
+
+def cmd_translate(args):
+    """Whole-text translation against sentence-split parallel translation."""
+    from translate.engine import TranslationEngine, parse_pairs
+
+    pair = parse_pairs(args.pair)[0]
+    engine = TranslationEngine(pairs=[pair], workers=args.workers)
+    try:
+        translation = engine.get(*pair)
+    except KeyError:
+        sys.exit(f"Translation pair {args.pair} could not be loaded: {engine.errors}")
+    for count in args.sentences:
+        text = sample_answer(count)
+        for label, fn in [
+            ("whole text", lambda: translation.translate(text)),
+            (f"split, {args.workers} workers", lambda: engine.translate(text, *pair)),
+        ]:
+            fn()
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                fn()
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{count:>3} sentences  {label:<20} {elapsed * 1000:9.1f} ms")
+
+
+def cmd_translator(args):
+    """Remote (HTTP to port 8100) against in-process translation of chat-sized payloads."""
+    import asyncio
+    from test_hindi import AsyncTranslationClient
+    from translate.engine import TranslationEngine, parse_pairs
+    from translate.translation_cache import TranslationCache
+    from translator import InProcessTranslator, RemoteTranslator
+
+    from_code, to_code = parse_pairs(args.pair)[0]
+    payloads = {
+        "8 short fields": lambda i: [f"{s} [{i}]" for s in (SAMPLE_SENTENCES * 2)[:8]],
+        "1 long answer": lambda i: [sample_answer(10) + f" [{i}]"],
+    }
+
+    async def run(translator):
+        await translator.start()
+        try:
+            for name, make in payloads.items():
+                await translator.translate_texts(make(-1), from_code, to_code)
+                start = time.perf_counter()
+                for i in range(args.repeat):
+                    # Unique texts per round so neither side answers from its cache
+                    await translator.translate_texts(make(i), from_code, to_code)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                print(f"{translator.name:<10} {name:<16} {elapsed * 1000:9.1f} ms/call")
+        finally:
+            await translator.aclose()
+
+    no_cache = dict(maxsize=0, path="")
+    asyncio.run(run(RemoteTranslator(AsyncTranslationClient())))
+    asyncio.run(run(InProcessTranslator(
+        engine=TranslationEngine(pairs=[(from_code, to_code)]), cache=TranslationCache(**no_cache)
+    )))
+
+
+def cmd_loadtest(args):
+    """Latency of a cheap endpoint on its own and while chats are in flight."""
+    import asyncio
+    import httpx
+    from metrics import LatencyStats
+
+    chat_body = {
+        "context": {"aadhar": args.aadhar, "crop_type": "tomato", "symptoms": "yellow leaves"},
+        "question": "What should I do about the yellowing leaves on my tomato plants?",
+        "language": args.language,
+    }
+
+    async def probe(client, stats):
+        for _ in range(args.probes):
+            start = time.perf_counter()
+            response = await client.post("/api/history", json={"aadhar": args.aadhar})
+            response.raise_for_status()
+            stats.record(time.perf_counter() - start)
+            await asyncio.sleep(args.interval)
+
+    async def chat(client, stop, stats):
+        while not stop.is_set():
+            start = time.perf_counter()
+            await client.post("/api/chat", json=chat_body)
+            stats.record(time.perf_counter() - start)
+
+    def show(label, stats):
+        s = stats.stats()
+        print(f"{label:<32} {s['count']:>5} requests  p50 {s['p50_ms']:8.1f} ms  "
+              f"p95 {s['p95_ms']:8.1f} ms  p99 {s['p99_ms']:8.1f} ms")
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.chats + 4)
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            idle = LatencyStats()
+            await probe(client, idle)
+            show("/api/history, idle", idle)
+
+            loaded = LatencyStats()
+            chats = LatencyStats()
+            stop = asyncio.Event()
+            workers = [asyncio.create_task(chat(client, stop, chats)) for _ in range(args.chats)]
+            # Give the chats time to reach the model before probing
+            await asyncio.sleep(args.ramp)
+            await probe(client, loaded)
+            stop.set()
+            await asyncio.gather(*workers, return_exceptions=True)
+            show(f"/api/history, {args.chats} chats running", loaded)
+            if chats.count:
+                show("/api/chat", chats)
+
+    asyncio.run(run())
+
+
+def cmd_login(args):
+    """bcrypt login throughput by hasher pool size, and session token checks."""
+    import asyncio
+    from auth import PasswordHasher, SessionTokens, pwd_context
+
+    hashed = pwd_context.hash("benchmark-password")
+
+    async def run(hasher):
+        await asyncio.gather(*(hasher.verify("benchmark-password", hashed) for _ in range(args.logins)))
+
+    for workers in args.workers:
+        hasher = PasswordHasher(workers=workers, max_pending=args.logins)
+        start = time.perf_counter()
+        asyncio.run(run(hasher))
+        elapsed = time.perf_counter() - start
+        hasher.shutdown()
+        print(f"bcrypt verify, {workers:>2} threads  {elapsed:8.2f} s  {args.logins / elapsed:9.1f} logins/s")
+
+    tokens = SessionTokens(secret="benchmark")
+    token = tokens.issue("123412341234")
+    count = 100000
+    start = time.perf_counter()
+    for _ in range(count):
+        tokens.verify(token)
+    elapsed = time.perf_counter() - start
+    print(f"session token verify           {elapsed:8.2f} s  {count / elapsed:9.1f} checks/s")
+
+
+def cmd_database(args):
+    """Concurrent chat writes and history reads: default SQLite, tuned SQLite, optional --url."""
+    import tempfile
+    import threading
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import create_db_engine
+    import models
+
+    def run(label, engine):
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        counts = {"writes": 0, "reads": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+
+        def write(db, i):
+            db.add(models.ChatInteraction(aadhar=f"{i % 50:012d}", question="q", answer=SAMPLE_SENTENCES[0]))
+            db.commit()
+
+        def read(db, i):
+            (db.query(models.ChatInteraction)
+             .filter(models.ChatInteraction.aadhar == f"{i % 50:012d}")
+             .order_by(models.ChatInteraction.id.desc())
+             .limit(10)
+             .all())
+
+        def worker(kind, fn):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                db = session_factory()
+                try:
+                    fn(db, i)
+                    key = kind
+                except Exception:
+                    db.rollback()
+                    key = "errors"
+                finally:
+                    db.close()
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=worker, args=("writes", write)) for _ in range(args.writers)]
+        threads += [threading.Thread(target=worker, args=("reads", read)) for _ in range(args.readers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+        print(f"{label:<28} {counts['writes'] / elapsed:9.1f} writes/s  {counts['reads'] / elapsed:9.1f} reads/s  "
+              f"{counts['errors']:>5} errors")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("sqlite, default settings",
+            create_engine(f"sqlite:///{tmp}/default.db", connect_args={"check_same_thread": False}))
+        run("sqlite, WAL + pragmas", create_db_engine(f"sqlite:///{tmp}/tuned.db"))
+    if args.url:
+        run(args.url.split(":", 1)[0], create_db_engine(args.url))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Krishi Drishti backend benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("parity", help="Check fast preprocessing against the HF processor")
+    p.add_argument("--images", default=DEFAULT_IMAGE_DIR)
+    p.add_argument("--tolerance", type=float, default=1e-4,
+                   help="Max absolute difference allowed without JPEG draft decoding")
+    p.add_argument("--draft-tolerance", type=float, default=0.05,
+                   help="Mean absolute difference allowed with JPEG draft decoding")
+    p.set_defaults(func=cmd_parity)
+
+    p = sub.add_parser("preprocess", help="Benchmark image preprocessing")
+    p.add_argument("--images", default=DEFAULT_IMAGE_DIR)
+    p.add_argument("--batch", type=int, default=16)
+    p.add_argument("--repeat", type=int, default=10)
+    p.set_defaults(func=cmd_preprocess)
+
+    p = sub.add_parser("backends", help="Compare detection inference backends")
+    p.add_argument("--images", default=DEFAULT_IMAGE_DIR)
+    p.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    p.add_argument("--batch", type=int, default=16)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=cmd_backends)
+
+    p = sub.add_parser("translate", help="Benchmark sentence-parallel translation")
+    p.add_argument("--pair", default="en-hi")
+    p.add_argument("--sentences", nargs="+", type=int, default=[1, 5, 20])
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=cmd_translate)
+
+    p = sub.add_parser("translator", help="Compare remote and in-process translators")
+    p.add_argument("--pair", default="en-hi")
+    p.add_argument("--repeat", type=int, default=10)
+    p.set_defaults(func=cmd_translator)
+
+    p = sub.add_parser("loadtest", help="Non-chat endpoint latency while chats are running")
+    p.add_argument("--url", default="http://localhost:8000")
+    p.add_argument("--aadhar", required=True, help="Farmer whose history is fetched and who chats")
+    p.add_argument("--language", default="en")
+    p.add_argument("--chats", type=int, default=8, help="Concurrent chat requests kept in flight")
+    p.add_argument("--probes", type=int, default=200)
+    p.add_argument("--interval", type=float, default=0.02, help="Seconds between probe requests")
+    p.add_argument("--ramp", type=float, default=2.0)
+    p.add_argument("--timeout", type=float, default=300.0)
+    p.set_defaults(func=cmd_loadtest)
+
+    p = sub.add_parser("login", help="Password verification throughput by thread count")
+    p.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, os.cpu_count() or 4])
+    p.add_argument("--logins", type=int, default=64)
+    p.set_defaults(func=cmd_login)
+
+    p = sub.add_parser("database", help="Concurrent database write/read throughput")
+    p.add_argument("--writers", type=int, default=4)
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--url", help="Also benchmark this database (its tables are created if missing)")
+    p.set_defaults(func=cmd_database)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
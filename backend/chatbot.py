@@ -1,9 +1,11 @@
 from langchain_ollama import ChatOllama
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.memory import ConversationBufferMemory
-import json
-from test_hindi import get_translated_text_hindi, get_translated_text_english
+import asyncio
+from translator import translator, normalize_language
+from memory_store import SessionMemoryStore
+from llm_gateway import LLMGateway, GatewayBusyError
+from answer_cache import AnswerCache
+from prompt_builder import build_prompt_inputs, format_history
 import re
 import logging
 
@@ -38,29 +40,66 @@ prompt = PromptTemplate(
     template=advisor_template
 )
 
-# Set up conversation memory
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    input_key="question"
-)
+# Template used to fold older turns into a farmer's running summary
+summary_template = """
+Summarize this conversation between a farmer and an agricultural advisor in at most {max_words} words.
+Keep the crop, the problems reported and the advice already given.
 
-# Create LLMChain
-chain = LLMChain(
-    llm=llm,
-    prompt=prompt,
-    memory=memory
-)
+Previous summary:
+{summary}
+
+New conversation:
+{conversation}
+
+Summary:
+"""
+
+# Bounded, farmer-fair access to the Ollama model for every generation below
+llm_gateway = LLMGateway()
+
+# Per-farmer conversation memory, bounded in sessions, turns and tokens
+memory_store = SessionMemoryStore()
+
+# Finished answers per language, keyed on the question and crop/soil/farming method
+answer_cache = AnswerCache()
+
+# Keep references to background summarization tasks until they finish
+background_tasks = set()
+
+# Marks the end of the token queue filled by generate_into
+END_OF_STREAM = object()
+
+# End of a sentence or line in a streamed English answer
+SENTENCE_END = re.compile(r"[.!?]+[\s]+|\n+")
+
+async def summarize_history(summary, turns, max_tokens):
+    """Fold turns into the running summary with the LLM."""
+    # Summaries queue as their own tenant so they cannot crowd out farmers
+    async with llm_gateway.slot("summaries"):
+        message = await llm.ainvoke(summary_template.format(
+            max_words=max_tokens,
+            summary=summary or "(none)",
+            conversation=format_history("", turns)
+        ))
+    return message.content
+
+def schedule_compaction(aadhar):
+    task = asyncio.create_task(memory_store.compact(aadhar, summarize_history))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 def bold_text(text):
     # Function to replace text within asterisks with bolded text (removing asterisks)
     return re.sub(r'\*', '', text)
 
-# Function to run the chatbot
-def run_plant_disease_chatbot(context, question, language="en"):
-    # Translate context fields to English if language is Hindi
-    if language == "hi" and isinstance(context, dict):
-        translated_context = context.copy()
-        # Fields likely to contain user-entered Hindi text
+async def prepare_chat(context, question, language="en"):
+    """Translate the farmer's input to English and build the prompt inputs.
+
+    Returns ``(aadhar, english_question, prompt_inputs)``.
+    """
+    # Translate context fields and the question to English in one batch for non-English chats
+    if language != "en":
+        # Fields likely to contain user-entered text in the farmer's language
         fields_to_translate = [
             "symptoms",
             "recent_weather",
@@ -70,51 +109,207 @@ def run_plant_disease_chatbot(context, question, language="en"):
             "crops_grown",
             "crop_type"
         ]
-        for field in fields_to_translate:
-            if field in translated_context and translated_context[field]:
-                try:
-                    translated_context[field] = get_translated_text_english(translated_context[field])
-                    logger.info(f"Translated context field '{field}' to English: {translated_context[field]}")
-                except Exception as e:
-                    logger.error(f"Failed to translate context field '{field}' to English: {str(e)}")
-                    # Keep original text if translation fails
-        context_str = json.dumps(translated_context, indent=2)
-    else:
-        # Convert context to string if it's a dict, or use as is
-        context_str = json.dumps(context, indent=2) if isinstance(context, dict) else context
-    
-    # Translate question to English if language is Hindi
-    if language == "hi":
+        fields = []
+        if isinstance(context, dict):
+            fields = [f for f in fields_to_translate if f in context and context[f]]
+        texts = [context[f] for f in fields] + [question]
         try:
-            question = get_translated_text_english(question)
-            logger.info(f"Translated Hindi question to English: {question}")
+            translated = await translator.translate_texts(texts, from_code=language, to_code="en")
+            question = translated[-1]
+            if fields:
+                context = {**context, **dict(zip(fields, translated[:-1]))}
+            logger.info(f"Translated {len(fields)} context fields and the question to English: {question}")
         except Exception as e:
-            logger.error(f"Failed to translate question to English: {str(e)}")
-            # Proceed with original question if translation fails
+            logger.error(f"Failed to translate context and question to English: {str(e)}")
+            # Proceed with original text if translation fails
+
+    # Compact context and token-bounded history (summary + recent turns) for the prompt
+    aadhar = context.get("aadhar") if isinstance(context, dict) else None
+    summary, turns = await memory_store.get_history(aadhar)
+    inputs, prompt_tokens = build_prompt_inputs(context, question, summary, turns)
+    logger.info(f"Prompt inputs for {aadhar or 'anonymous'}: ~{prompt_tokens} tokens, {len(turns)} recent turns")
+    return aadhar, question, inputs
+
+async def remember_turn(aadhar, question, response):
+    """Record an English turn in the farmer's memory and save it for rehydration."""
+    pending = memory_store.append(aadhar, question, response)
+    await memory_store.save(aadhar, question, response)
+    if pending:
+        # Summarize older turns after answering so the farmer doesn't wait for it
+        schedule_compaction(aadhar)
+
+async def answer_cacheable(context):
+    """Whether the answer may come from, or go into, the answer cache.
+
+    The cache key is the question and context only, so a follow-up like
+    "how much should I spray?" would get whichever answer another farmer's
+    conversation produced. Only a farmer's first turn is cached; answers in
+    an ongoing conversation always go to the model.
+    """
+    aadhar = context.get("aadhar") if isinstance(context, dict) else None
+    return not await memory_store.has_history(aadhar)
+
+async def cached_answer(context, question, language):
+    """Return a cached answer for the farmer's question, or None.
+
+    A hit is still recorded in the farmer's history, in English.
+    """
+    entry = await answer_cache.get(question, context, language)
+    if entry is None:
+        return None
+    aadhar = context.get("aadhar") if isinstance(context, dict) else None
+    await remember_turn(aadhar, entry["question_en"], entry["answer_en"])
+    return entry["answer"]
+
+async def cache_answer(context, question, language, answer, question_en, answer_en):
+    # The translator returns English when it fails; never cache that as a translation
+    if language != "en" and answer == bold_text(answer_en):
+        return
+    await answer_cache.set(question, context, language, answer, question_en, answer_en)
+
+# Function to run the chatbot
+async def run_plant_disease_chatbot(context, question, language="en"):
+    language = normalize_language(language)
+    cacheable = await answer_cacheable(context)
+    cached = await cached_answer(context, question, language) if cacheable else None
+    if cached is not None:
+        return cached
+    original_question = question
+    aadhar, question, inputs = await prepare_chat(context, question, language)
     
-    # Run the chain with the (possibly translated) question and context
+    # Ask the model with the (possibly translated) question, context and this farmer's history.
+    # ainvoke keeps the event loop free while Ollama generates.
     try:
-        response = chain.run(
-            farmer_context=context_str,
-            question=question
-        )
+        async with llm_gateway.slot(aadhar):
+            message = await llm.ainvoke(prompt.format(**inputs))
+        response = message.content
+        await remember_turn(aadhar, question, response)
+    except GatewayBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error running chatbot: {str(e)}")
-        response = "Sorry, I encountered an error while processing your request."
+        return bold_text("Sorry, I encountered an error while processing your request.")
+    answer_en = response
     
-    # Translate response to Hindi if language is Hindi
-    if language == "hi":
+    # Translate response back to the farmer's language
+    if language != "en":
         try:
-            response = get_translated_text_hindi(response)
-            logger.info(f"Translated response to Hindi: {response}")
+            response = await translator.translate(response, from_code="en", to_code=language)
+            logger.info(f"Translated response to '{language}': {response}")
         except Exception as e:
-            logger.error(f"Failed to translate response to Hindi: {str(e)}")
+            logger.error(f"Failed to translate response to '{language}': {str(e)}")
             # Return English response if translation fails
     
-    return bold_text(response)
+    response = bold_text(response)
+    if cacheable:
+        await cache_answer(context, original_question, language, response, question, answer_en)
+    return response
 
-# Example usage
-if __name__ == "__main__":
+def split_complete_sentences(buffer):
+    """Split off the complete sentences/lines at the start of buffer.
+
+    Returns ``(complete, rest)``; ``complete`` is empty until a sentence ends.
+    """
+    match = None
+    for match in SENTENCE_END.finditer(buffer):
+        pass
+    if match is None:
+        return "", buffer
+    return buffer[:match.end()], buffer[match.end():]
+
+async def translate_piece(text, language):
+    """Translate part of a streamed answer, keeping its trailing whitespace."""
+    stripped = text.rstrip()
+    translated = await translator.translate(stripped, from_code="en", to_code=language)
+    return translated + text[len(stripped):]
+
+async def generate_into(tokens, aadhar, text):
+    """Generate an answer in a gateway slot, queueing tokens as they arrive.
+
+    The slot is released as soon as the model finishes, however slowly the
+    tokens are translated or sent. The queue ends with END_OF_STREAM or the
+    exception that stopped the generation.
+    """
+    try:
+        async with llm_gateway.slot(aadhar):
+            async for chunk in llm.astream(text):
+                if chunk.content:
+                    tokens.put_nowait(chunk.content)
+    except Exception as e:
+        tokens.put_nowait(e)
+    else:
+        tokens.put_nowait(END_OF_STREAM)
+
+async def stream_plant_disease_chatbot(context, question, language="en"):
+    """Yield the answer in pieces as the LLM generates it.
+
+    English chats get raw token deltas; other languages get whole sentences
+    translated as soon as each one is complete. A cached answer (first turns
+    only, see answer_cacheable) is yielded in one piece. Raises GatewayBusyError before the first piece if the model
+    is too busy.
+    """
+    language = normalize_language(language)
+    cacheable = await answer_cacheable(context)
+    cached = await cached_answer(context, question, language) if cacheable else None
+    if cached is not None:
+        yield cached
+        return
+    original_question = question
+    aadhar, question, inputs = await prepare_chat(context, question, language)
+    response = ""
+    pending = ""
+    answer = ""
+    truncated = False
+    tokens = asyncio.Queue()
+    producer = asyncio.create_task(generate_into(tokens, aadhar, prompt.format(**inputs)))
+    try:
+        while True:
+            token = await tokens.get()
+            # Take everything generated while the last piece was being sent
+            while not tokens.empty() and isinstance(token, str):
+                following = tokens.get_nowait()
+                if not isinstance(following, str):
+                    tokens.put_nowait(following)
+                    break
+                token += following
+            if token is END_OF_STREAM:
+                break
+            if isinstance(token, Exception):
+                raise token
+            response += token
+            if language == "en":
+                piece = bold_text(token)
+            else:
+                pending += token
+                complete, pending = split_complete_sentences(pending)
+                if not complete:
+                    continue
+                piece = bold_text(await translate_piece(complete, language))
+            answer += piece
+            yield piece
+    except GatewayBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming chatbot response: {str(e)}")
+        if not response:
+            yield "Sorry, I encountered an error while processing your request."
+            return
+        # Keep what was streamed, but don't cache a truncated answer
+        truncated = True
+    finally:
+        # Stops the generation (and frees its slot) if the client went away mid-answer
+        producer.cancel()
+    if pending.strip():
+        piece = bold_text(await translate_piece(pending, language))
+        answer += piece
+        yield piece
+    if response:
+        await remember_turn(aadhar, question, response)
+    if response and cacheable and not truncated:
+        await cache_answer(context, original_question, language, answer, question, response)
+
+async def main():
+    await translator.start()
     farmer_context = {
         "crop_type": "टमाटर",
         "location": "मध्य घाटी, कैलिफोर्निया",
@@ -128,15 +323,19 @@ if __name__ == "__main__":
     question_hi = "मेरे टमाटर के पौधों में पीले पत्तों और मुरझाने के लिए मुझे क्या करना चाहिए?"
     
     print("Expert Advice (English):")
-    response = run_plant_disease_chatbot(farmer_context, question_en, language="en")
+    response = await run_plant_disease_chatbot(farmer_context, question_en, language="en")
     print(response)
     
     print("\nExpert Advice (Hindi):")
-    response = run_plant_disease_chatbot(farmer_context, question_hi, language="hi")
+    response = await run_plant_disease_chatbot(farmer_context, question_hi, language="hi")
     print(response)
     
     follow_up = "Are there any organic sprays I can use?"
     print("\nFollow-up Advice (English):")
-    response = run_plant_disease_chatbot(farmer_context, follow_up, language="en")
+    response = await run_plant_disease_chatbot(farmer_context, follow_up, language="en")
     print(response)
+    await translator.aclose()
 
+# Example usage
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,87 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./farmers.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+# Async drivers used for plain URLs: aiosqlite locally, asyncpg for Postgres
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def is_sqlite(url):
+    return url.startswith("sqlite")
+
+
+def async_url(url):
+    """Rewrite a plain database URL to use its async driver."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for many readers alongside one writer."""
+    cursor = dbapi_connection.cursor()
+    # Readers no longer block the writer (or each other) and commits skip most fsyncs
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _engine_options(url, use_async):
+    """Pool settings: SQLite files get a sized pool, in-memory SQLite a single
+    shared connection, other databases (e.g. Postgres) a pre-pinged pool."""
+    pool = {
+        "poolclass": AsyncAdaptedQueuePool if use_async else QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if not is_sqlite(url):
+        return dict(pool, pool_pre_ping=True)
+    connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if url.partition("://")[2] in ("", "/:memory:"):
+        # Otherwise every checkout would see its own empty database
+        return {"connect_args": connect_args, "poolclass": StaticPool}
+    # Pooled connections keep their pragmas and page cache between requests
+    return dict(pool, connect_args=connect_args)
+
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, tune_sqlite=True):
+    """Synchronous engine for ``url``, for scripts and benchmarks."""
+    sync_engine = create_engine(url, **_engine_options(url, use_async=False))
+    if is_sqlite(url) and tune_sqlite:
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    return sync_engine
+
+
+def create_async_db_engine(url=SQLALCHEMY_DATABASE_URL):
+    """Async engine for ``url`` (aiosqlite or asyncpg), used by the API."""
+    async_engine = create_async_engine(async_url(url), **_engine_options(url, use_async=True))
+    if is_sqlite(url):
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+
+engine = create_async_db_engine()
+
+# Objects stay usable after commit without another round-trip to reload them
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
 
+async def create_tables(metadata):
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
@@ -1,10 +1,19 @@
 import argparse
 from PIL import Image
+import numpy as np
 import torch
-import torch.nn.functional as F
 from transformers import AutoImageProcessor, AutoModelForImageClassification
+import io
 import os
-from test_hindi import get_translated_text_hindi
+import resource
+import threading
+import time
+import logging
+from config import DETECT_MODEL_NAME, DETECT_WARMUP, DETECT_JPEG_DRAFT, DETECT_BACKEND, DETECT_TOP_K
+from backends import BACKENDS, create_backend
+from labels import LabelTable
+
+logger = logging.getLogger(__name__)
 
 def load_model_and_processor(model_name):
     """Load the model and processor from Hugging Face."""
@@ -16,11 +25,184 @@ def load_model_and_processor(model_name):
         print(f"Error loading model or processor: {e}")
         return None, None
 
-def preprocess_image(image_path, processor):
-    """Preprocess the input image."""
+class FastPreprocessor:
+    """Resize/crop/normalize pipeline built once from an image processor's config.
+
+    ``load`` decodes one image to a cropped uint8 HWC array (using JPEG draft
+    mode to decode at a reduced size where possible) and ``to_tensor`` rescales
+    and normalizes a whole batch of those arrays in one vectorized step.
+    """
+
+    def __init__(self, size, crop_size=None, resample=Image.BILINEAR,
+                 rescale_factor=1 / 255, image_mean=(0.5, 0.5, 0.5),
+                 image_std=(0.5, 0.5, 0.5), jpeg_draft=DETECT_JPEG_DRAFT):
+        self.size = size
+        self.crop_size = crop_size
+        self.resample = resample
+        self.jpeg_draft = jpeg_draft
+        mean = np.asarray(image_mean, dtype=np.float32).reshape(1, 3, 1, 1)
+        std = np.asarray(image_std, dtype=np.float32).reshape(1, 3, 1, 1)
+        # (x * rescale - mean) / std folded into a single multiply-add
+        self._scale = (rescale_factor / std).astype(np.float32)
+        self._shift = (-mean / std).astype(np.float32)
+
+    @classmethod
+    def from_processor(cls, processor, **kwargs):
+        size = processor.size if processor.do_resize else None
+        crop_size = getattr(processor, "crop_size", None)
+        if not getattr(processor, "do_center_crop", False):
+            crop_size = None
+        rescale_factor = processor.rescale_factor if processor.do_rescale else 1.0
+        if processor.do_normalize:
+            image_mean, image_std = processor.image_mean, processor.image_std
+        else:
+            image_mean, image_std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        return cls(
+            size=dict(size) if size else None,
+            crop_size=dict(crop_size) if crop_size else None,
+            resample=int(processor.resample),
+            rescale_factor=rescale_factor,
+            image_mean=image_mean,
+            image_std=image_std,
+            **kwargs
+        )
+
+    def _target_size(self, width, height):
+        """(width, height) after resizing, following the Hugging Face rules."""
+        if not self.size:
+            return width, height
+        if "shortest_edge" in self.size:
+            short = self.size["shortest_edge"]
+            if width <= height:
+                return short, int(short * height / width)
+            return int(short * width / height), short
+        return self.size["width"], self.size["height"]
+
+    def load(self, source):
+        """Decode, resize and center-crop one image to a uint8 (H, W, 3) array."""
+        return self.load_image(open_image(source))
+
+    def load_image(self, image):
+        """Resize and center-crop an opened PIL image to a uint8 (H, W, 3) array."""
+        if self.jpeg_draft and image.format == "JPEG":
+            target = self._target_size(*image.size)
+            image.draft("RGB", target)
+        width, height = image.size
+        image = image.convert("RGB")
+        target = self._target_size(width, height)
+        if image.size != target:
+            image = image.resize(target, resample=self.resample)
+        if self.crop_size:
+            crop_w, crop_h = self.crop_size["width"], self.crop_size["height"]
+            left = (image.width - crop_w) // 2
+            top = (image.height - crop_h) // 2
+            image = image.crop((left, top, left + crop_w, top + crop_h))
+        return np.asarray(image, dtype=np.uint8)
+
+    def to_tensor(self, arrays):
+        """Stack uint8 HWC arrays into a normalized float32 (N, 3, H, W) tensor."""
+        batch = np.stack(arrays).transpose(0, 3, 1, 2).astype(np.float32)
+        batch *= self._scale
+        batch += self._shift
+        return torch.from_numpy(np.ascontiguousarray(batch))
+
+    def __call__(self, sources):
+        return self.to_tensor([self.load(source) for source in sources])
+
+def _rss_bytes():
+    """Peak resident set size of this process in bytes (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class ModelRegistry:
+    """Process-wide holder for the disease classifier.
+
+    The processor and model are loaded once (normally from the FastAPI startup
+    hook), switched to eval mode and warmed up, then shared by every request.
+    Only the selected backend is kept: with an ONNX backend the PyTorch model
+    is dropped once it has been exported.
+    """
+
+    def __init__(self, model_name=DETECT_MODEL_NAME, backend=DETECT_BACKEND):
+        self.model_name = model_name
+        self.backend_name = backend
+        self.processor = None
+        self.preprocessor = None
+        self.backend = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.param_bytes = None
+        self.rss_delta_bytes = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.backend is not None
+
+    def load(self, warmup=DETECT_WARMUP):
+        """Load the checkpoint if it is not loaded yet and return (processor, backend)."""
+        with self._lock:
+            if self.loaded:
+                return self.processor, self.backend
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            processor, model = load_model_and_processor(self.model_name)
+            if processor is None or model is None:
+                raise RuntimeError(f"Failed to load model {self.model_name}")
+            model.eval()
+            backend = create_backend(self.backend_name, model, self.model_name)
+            # Torch backends hold the model themselves; ONNX ones no longer need it
+            del model
+            self.load_seconds = time.perf_counter() - start
+            self.param_bytes = backend.weight_bytes()
+            self.processor, self.backend = processor, backend
+            self.preprocessor = FastPreprocessor.from_processor(processor)
+            if warmup:
+                self._warmup()
+            self.rss_delta_bytes = _rss_bytes() - rss_before
+            logger.info(
+                f"Loaded {self.model_name} in {self.load_seconds:.2f}s "
+                f"({self.backend_name} weights {self.param_bytes / 2**20:.1f} MiB, "
+                f"rss +{self.rss_delta_bytes / 2**20:.1f} MiB)"
+            )
+            return self.processor, self.backend
+
+    def _warmup(self):
+        start = time.perf_counter()
+        image = Image.new("RGB", (224, 224))
+        pixel_values = self.preprocessor.to_tensor([self.preprocessor.load_image(image)])
+        self.backend.logits(pixel_values)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def get(self):
+        """Return the shared (processor, backend), loading them on first use."""
+        if not self.loaded:
+            return self.load()
+        return self.processor, self.backend
+
+    def stats(self):
+        return {
+            "model_name": self.model_name,
+            "backend": self.backend_name,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "param_bytes": self.param_bytes,
+            "rss_delta_bytes": self.rss_delta_bytes,
+        }
+
+registry = ModelRegistry()
+
+def open_image(source):
+    """Open an image from a path, raw bytes or a binary file-like object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+def preprocess_image(source, processor):
+    """Preprocess the input image (a path, bytes or file-like object)."""
     try:
         # Open and convert image to RGB
-        image = Image.open(image_path).convert("RGB")
+        image = open_image(source).convert("RGB")
         # Process image (resize to 224x224 and normalize)
         inputs = processor(images=image, return_tensors="pt")
         return inputs
@@ -28,44 +210,64 @@ def preprocess_image(image_path, processor):
         print(f"Error processing image: {e}")
         return None
 
-def predict_disease(image_path, processor, model, language="en"):
+def predict_top_k(pixel_values, backend, k=1):
+    """Classify a (N, 3, H, W) batch in one forward pass.
+
+    Returns, for each image, a list of the k most likely
+    (predicted_class, confidence) tuples, best first.
+    """
+    logits = backend.logits(pixel_values)
+    # Apply softmax to get probabilities
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    probs = exp / exp.sum(axis=-1, keepdims=True)
+    k = min(k, probs.shape[-1])
+    indices = np.argsort(-probs, axis=-1)[:, :k]
+    return [
+        [(backend.id2label[int(idx)], float(row[idx])) for idx in top]
+        for top, row in zip(indices, probs)
+    ]
+
+def predict_batch(pixel_values, backend):
+    """Classify a (N, 3, H, W) batch and return one (predicted_class, confidence) per image."""
+    return [top[0] for top in predict_top_k(pixel_values, backend)]
+
+def run_registry_batch(arrays):
+    """Classify a list of FastPreprocessor.load arrays with the shared registry backend.
+
+    Returns the DETECT_TOP_K best predictions for each image.
+    """
+    registry.get()
+    return predict_top_k(registry.preprocessor.to_tensor(arrays), registry.backend, DETECT_TOP_K)
+
+def predict_disease(source, processor, backend, language="en"):
     """Run inference and return the predicted disease class and confidence."""
-    inputs = preprocess_image(image_path, processor)
+    inputs = preprocess_image(source, processor)
     if inputs is None:
         return None, None
-    
-    # Run model inference
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-        # Apply softmax to get probabilities
-        probs = F.softmax(logits, dim=-1)
-        predicted_class_idx = probs.argmax(-1).item()
-        confidence = probs[0, predicted_class_idx].item()
-        predicted_class = model.config.id2label[predicted_class_idx]
-        
-        # Apply Hindi translation only if language is 'hi'
-        if language == "hi":
-            predicted_class = get_translated_text_hindi(predicted_class)
-            confidence_str = get_translated_text_hindi(f"{confidence:.2%}")
-        else:
-            confidence_str = f"{confidence:.2%}"
-        
-        return predicted_class, confidence
+
+    predicted_class, confidence = predict_batch(inputs["pixel_values"], backend)[0]
+
+    # Translated labels come from the precomputed label table
+    if language != "en":
+        label_table = LabelTable()
+        label_table.load()
+        predicted_class = label_table.translate(predicted_class, language)
+
+    return predicted_class, confidence
 
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Classify plant disease from an image using MobileNet V2.")
     parser.add_argument("--image", type=str, help="Path to the input image")
-    parser.add_argument("--language", type=str, default="en", help="Language for output (en or hi)")
+    parser.add_argument("--language", type=str, default="en", help="Language for output (en, hi, ...)")
+    parser.add_argument("--backend", type=str, default=DETECT_BACKEND, choices=BACKENDS, help="Inference backend")
     args = parser.parse_args()
 
-    # Model name
-    model_name = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
-
     # Load model and processor
-    processor, model = load_model_and_processor(model_name)
-    if processor is None or model is None:
+    registry.backend_name = args.backend
+    try:
+        processor, backend = registry.load(warmup=False)
+    except RuntimeError:
         print("Failed to load model. Exiting.")
         return
 
@@ -81,7 +283,7 @@ def main():
         return
 
     # Predict disease
-    predicted_class, confidence = predict_disease(image_path, processor, model, args.language)
+    predicted_class, confidence = predict_disease(image_path, processor, backend, args.language)
     if predicted_class and confidence is not None:
         print(f"Predicted plant disease: {predicted_class}")
         print(f"Confidence level: {confidence}")
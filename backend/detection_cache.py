@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from cache import LRUCache
+from config import (
+    DETECT_CACHE_SIZE, DETECT_CACHE_TTL, DETECT_CACHE_KEY, DETECT_CACHE_PERSIST,
+    DETECT_CACHE_PHASH_TOLERANCE, DETECT_MODEL_NAME, DETECT_BACKEND
+)
+from database import AsyncSessionLocal
+import models
+
+logger = logging.getLogger(__name__)
+
+
+def _block_means(image, rows, cols):
+    """Grayscale ``rows`` x ``cols`` block averages of a uint8 (H, W, 3) image array."""
+    gray = image.astype(np.float32).mean(axis=2)
+    h, w = gray.shape
+    bh, bw = h // rows, w // cols
+    return gray[:bh * rows, :bw * cols].reshape(rows, bh, cols, bw).mean(axis=(1, 3))
+
+
+def perceptual_hash(image, hash_size=16):
+    """256-bit difference hash of a preprocessed uint8 (H, W, 3) image array.
+
+    Each bit says whether a block is brighter than its right neighbour, which
+    tracks the gradients of the leaf rather than its overall light/dark layout.
+    """
+    blocks = _block_means(image, hash_size, hash_size + 1)
+    bits = (blocks[:, 1:] > blocks[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def thumbnail(image, size=16):
+    """Small grayscale copy stored with phash entries to confirm a hit."""
+    return _block_means(image, size, size).round().astype(np.uint8).tobytes().hex()
+
+
+def thumbnails_match(a, b, tolerance=DETECT_CACHE_PHASH_TOLERANCE):
+    a = np.frombuffer(bytes.fromhex(a), dtype=np.uint8).astype(np.float32)
+    b = np.frombuffer(bytes.fromhex(b), dtype=np.uint8).astype(np.float32)
+    return a.shape == b.shape and float(np.abs(a - b).mean()) <= tolerance
+
+
+class DetectionCache:
+    """Content-addressed cache of detection results.
+
+    Keys are the SHA-256 of the uploaded image bytes (``sha256`` mode) or a
+    perceptual hash of the preprocessed image (``phash`` mode), scoped to the
+    model and backend so a model change never serves stale results. Values are
+    the ranked (disease, confidence) predictions for the image. Entries live in
+    a bounded LRU with TTL and can optionally be persisted to SQLite.
+
+    Different photos can share a perceptual hash, so ``phash`` entries also
+    keep a 16x16 grayscale thumbnail and a hit only counts when the new
+    image's thumbnail is within ``DETECT_CACHE_PHASH_TOLERANCE`` of it.
+    """
+
+    def __init__(self, maxsize=DETECT_CACHE_SIZE, ttl=DETECT_CACHE_TTL,
+                 key_mode=DETECT_CACHE_KEY, persist=DETECT_CACHE_PERSIST):
+        if key_mode not in ("sha256", "phash"):
+            raise ValueError(f"Unknown detection cache key mode '{key_mode}'")
+        self.key_mode = key_mode
+        self.persist = persist and maxsize > 0
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.persisted_hits = 0
+        self.collisions = 0
+        self._scope = f"{DETECT_MODEL_NAME}:{DETECT_BACKEND}"
+
+    @property
+    def enabled(self):
+        return self.memory.maxsize > 0
+
+    @property
+    def needs_pixels(self):
+        """True when the key can only be computed after preprocessing."""
+        return self.key_mode == "phash"
+
+    def key_for(self, image_bytes=None, image=None):
+        if self.key_mode == "phash":
+            digest = perceptual_hash(image)
+        else:
+            digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{self._scope}:{self.key_mode}:{digest}"
+
+    async def get(self, key, image=None):
+        """Cached predictions for ``key``; in phash mode ``image`` must be given."""
+        entry = self.memory.get(key)
+        if entry is None and self.persist:
+            entry = await self._load(key)
+            if entry is not None:
+                self.persisted_hits += 1
+                self.memory.set(key, entry)
+        if entry is None:
+            return None
+        if self.needs_pixels:
+            if not thumbnails_match(entry["thumbnail"], thumbnail(image)):
+                # Same hash, different photo
+                self.collisions += 1
+                return None
+            return entry["predictions"]
+        return entry
+
+    async def set(self, key, value, image=None):
+        if not self.enabled:
+            return
+        if self.needs_pixels:
+            value = {"predictions": value, "thumbnail": thumbnail(image)}
+        self.memory.set(key, value)
+        if self.persist:
+            await self._store(key, value)
+
+    async def _load(self, key):
+        async with AsyncSessionLocal() as db:
+            entry = await db.scalar(
+                select(models.DetectionCacheEntry).where(models.DetectionCacheEntry.key == key)
+            )
+            if entry is None:
+                return None
+            if self.ttl and entry.created_at + self.ttl < time.time():
+                await db.delete(entry)
+                await db.commit()
+                return None
+            value = json.loads(entry.predictions)
+            if isinstance(value, dict):
+                return dict(value, predictions=[tuple(p) for p in value["predictions"]])
+            return [tuple(p) for p in value]
+
+    async def _store(self, key, value):
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add(models.DetectionCacheEntry(
+                    key=key, predictions=json.dumps(value), created_at=time.time()
+                ))
+                await db.commit()
+            except IntegrityError:
+                # Another request stored the same image first
+                await db.rollback()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Failed to persist detection cache entry: {str(e)}")
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update({
+            "key_mode": self.key_mode,
+            "persist": self.persist,
+            "persisted_hits": self.persisted_hits,
+            "collisions": self.collisions,
+        })
+        return stats
@@ -0,0 +1,189 @@
+"""Precomputed translations of the disease classifier's labels.
+
+Detection results are looked up in a per-language table generated once from
+the model's ``id2label`` instead of being machine-translated per request.
+The API builds any missing table for CHAT_LANGUAGES in the background at
+startup (labels are translated per request until it is ready). Tables can
+also be rebuilt by hand, e.g. after a model change:
+
+    python labels.py build --languages hi ta te kn
+
+A table is never written when the translator returns labels unchanged.
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import logging
+import os
+import sys
+
+from config import DETECT_MODEL_NAME, LABELS_DIR
+
+logger = logging.getLogger(__name__)
+
+LABEL_TABLE_VERSION = 1
+
+
+class LabelTranslationError(RuntimeError):
+    """Raised when labels come back untranslated (e.g. the translator is down)."""
+
+
+def display_label(label):
+    """Human-readable form of a raw id2label entry, e.g. 'Tomato___Late_blight'."""
+    return " ".join(label.replace("_", " ").split())
+
+
+def table_path(model_name, language, labels_dir=LABELS_DIR):
+    return os.path.join(labels_dir, f"{model_name.replace('/', '__')}.{language}.json")
+
+
+class LabelTable:
+    """In-memory label -> translated label lookup, one dict per language."""
+
+    def __init__(self, model_name=DETECT_MODEL_NAME, labels_dir=LABELS_DIR):
+        self.model_name = model_name
+        self.labels_dir = labels_dir
+        self.tables = {}
+        self.versions = {}
+        self.misses = 0
+
+    def load(self):
+        """Load every table generated for this model; returns the loaded languages."""
+        pattern = table_path(self.model_name, "*", self.labels_dir)
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as f:
+                table = json.load(f)
+            if table.get("version") != LABEL_TABLE_VERSION or table.get("model") != self.model_name:
+                logger.warning(f"Ignoring stale label table {path}")
+                continue
+            if table["language"] != "en" and untranslated(table["labels"]):
+                logger.warning(f"Ignoring untranslated label table {path}; rebuild it")
+                continue
+            self.add(table["language"], table["labels"], table.get("generated_at"))
+        if self.tables:
+            logger.info(f"Loaded label tables for: {', '.join(sorted(self.tables))}")
+        else:
+            logger.warning(f"No label tables in {self.labels_dir}; run 'python labels.py build'")
+        return list(self.tables)
+
+    def add(self, language, labels, generated_at=None):
+        self.tables[language] = labels
+        self.versions[language] = generated_at
+
+    def lookup(self, label, language="en"):
+        """Return the label in ``language``, or None when there is no table entry."""
+        if language == "en":
+            return label
+        translated = self.tables.get(language, {}).get(label)
+        if translated is None:
+            self.misses += 1
+        return translated
+
+    def translate(self, label, language="en"):
+        """Return the label in ``language``, falling back to the English label."""
+        translated = self.lookup(label, language)
+        return label if translated is None else translated
+
+    async def build_missing(self, id2label, languages, translator):
+        """Generate and save tables for the languages that have none; returns them.
+
+        Languages whose labels come back untranslated are skipped (and retried
+        on the next start).
+        """
+        built = []
+        for language in languages:
+            if language == "en" or language in self.tables:
+                continue
+            try:
+                labels = await build_table(id2label, language, translator)
+            except LabelTranslationError as e:
+                logger.warning(f"Label table for '{language}' not built: {str(e)}")
+                continue
+            path = write_table(self.model_name, language, labels, self.labels_dir)
+            self.add(language, labels)
+            logger.info(f"Built label table {path}")
+            built.append(language)
+        return built
+
+    def stats(self):
+        return {
+            "languages": {lang: len(labels) for lang, labels in self.tables.items()},
+            "versions": self.versions,
+            "misses": self.misses,
+        }
+
+
+def untranslated(labels):
+    """Raw labels whose translation is just the English display label."""
+    return [raw for raw, translated in labels.items() if translated.strip() == display_label(raw)]
+
+
+async def build_table(id2label, language, translator):
+    """Translate every label once with a translator.Translator, in a single batch.
+
+    Translators return the input when they fail, so any label that comes back
+    unchanged raises LabelTranslationError instead of producing an English table.
+    """
+    raw = [id2label[idx] for idx in sorted(id2label, key=int)]
+    translated = await translator.translate_texts(
+        [display_label(label) for label in raw], from_code="en", to_code=language
+    )
+    labels = dict(zip(raw, translated))
+    missing = untranslated(labels)
+    if missing:
+        raise LabelTranslationError(
+            f"{len(missing)} of {len(labels)} labels were not translated to '{language}', e.g. {missing[0]!r}"
+        )
+    return labels
+
+
+def write_table(model_name, language, labels, labels_dir=LABELS_DIR):
+    os.makedirs(labels_dir, exist_ok=True)
+    path = table_path(model_name, language, labels_dir)
+    table = {
+        "version": LABEL_TABLE_VERSION,
+        "model": model_name,
+        "language": language,
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "labels": labels,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build translated label tables for the disease classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Regenerate label tables from the model's id2label")
+    build.add_argument("--model", default=DETECT_MODEL_NAME)
+    build.add_argument("--languages", nargs="+", default=["hi"])
+    build.add_argument("--labels-dir", default=LABELS_DIR)
+    args = parser.parse_args()
+
+    from transformers import AutoConfig
+    from translator import translator
+
+    id2label = AutoConfig.from_pretrained(args.model).id2label
+
+    async def build_all():
+        await translator.start()
+        try:
+            for language in args.languages:
+                labels = await build_table(id2label, language, translator)
+                path = write_table(args.model, language, labels, args.labels_dir)
+                print(f"Wrote {len(labels)} {language} labels to {path}")
+        finally:
+            await translator.aclose()
+
+    try:
+        asyncio.run(build_all())
+    except LabelTranslationError as e:
+        # Nothing is written for the failed language; an English table would look valid
+        sys.exit(f"Label translation failed: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
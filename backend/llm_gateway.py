@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_QUEUE_DEPTH, LLM_MAX_WAIT_SECONDS, LLM_DEFAULT_GENERATION_SECONDS
+)
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayBusyError(Exception):
+    """Raised when a generation cannot start within the caller's deadline."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LLMGateway:
+    """Admission control for the local Ollama model.
+
+    At most ``max_concurrency`` generations run at once. Callers beyond that
+    wait in one queue per farmer and free slots are handed out round-robin
+    across farmers, so a single farmer firing many questions cannot starve the
+    rest. A request is rejected up front when the queue is full or its
+    estimated wait exceeds ``max_wait``, and again if it is still queued when
+    ``max_wait`` runs out.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue_depth=LLM_QUEUE_DEPTH,
+                 max_wait=LLM_MAX_WAIT_SECONDS, default_generation_seconds=LLM_DEFAULT_GENERATION_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_wait = max_wait
+        self.default_generation_seconds = default_generation_seconds
+        self._active = 0
+        # key -> waiting futures; the key order is the round-robin rotation
+        self._waiting = OrderedDict()
+        self._queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_time = LatencyStats()
+        self.generation_time = LatencyStats()
+
+    def estimated_wait(self):
+        """Seconds a request queued now would wait for a slot."""
+        if self._active < self.max_concurrency and not self._queued:
+            return 0.0
+        generation = self.generation_time.mean() or self.default_generation_seconds
+        return generation * (self._queued + 1) / self.max_concurrency
+
+    @asynccontextmanager
+    async def slot(self, key=None, max_wait=None):
+        """Hold one generation slot for the body of the ``async with`` block."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = time.perf_counter()
+        await self._acquire(key, max_wait)
+        acquired = time.perf_counter()
+        self.admitted += 1
+        self.wait_time.record(acquired - start)
+        try:
+            yield
+        finally:
+            self.generation_time.record(time.perf_counter() - acquired)
+            self._release()
+
+    async def _acquire(self, key, max_wait):
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            return
+        if self._queued >= self.max_queue_depth or self.estimated_wait() > max_wait:
+            self.rejected += 1
+            logger.warning(f"LLM gateway rejected a request: {self._queued} queued, {self._active} running")
+            raise GatewayBusyError(self._retry_after())
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(key, deque()).append(future)
+        self._queued += 1
+        try:
+            await asyncio.wait({future}, timeout=max_wait)
+        except asyncio.CancelledError:
+            # Client went away; give back a slot that was handed over meanwhile
+            if future.done():
+                self._release()
+            else:
+                self._remove(key, future)
+            raise
+        if not future.done():
+            self._remove(key, future)
+            self.timed_out += 1
+            raise GatewayBusyError(self._retry_after())
+
+    def _release(self):
+        # Hand the slot straight to the next farmer in the rotation
+        if not self._waiting:
+            self._active -= 1
+            return
+        key, queue = self._waiting.popitem(last=False)
+        future = queue.popleft()
+        if queue:
+            self._waiting[key] = queue
+        self._queued -= 1
+        future.set_result(None)
+
+    def _remove(self, key, future):
+        queue = self._waiting.get(key)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self._waiting[key]
+        self._queued -= 1
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued,
+            "max_queue_depth": self.max_queue_depth,
+            "waiting_farmers": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "estimated_wait_seconds": self.estimated_wait(),
+            "wait": self.wait_time.stats(),
+            "generation": self.generation_time.stats(),
+        }
@@ -1,15 +1,32 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, engine, create_tables
 import models
-from detect import load_model_and_processor, preprocess_image, predict_disease
-from chatbot import run_plant_disease_chatbot
-from passlib.context import CryptContext
-import os
+from detect import registry, run_registry_batch
+from batching import BatchScheduler, QueueFullError
+from detection_cache import DetectionCache
+from labels import LabelTable, display_label
+from translator import translator, normalize_language
+from chatbot import run_plant_disease_chatbot, stream_plant_disease_chatbot, memory_store, llm_gateway, answer_cache
+from llm_gateway import GatewayBusyError
+from metrics import LatencyStats
+from singleflight import SingleFlight, fingerprint
+from auth import password_hasher, session_tokens, HasherBusyError
+from uploads import (
+    read_upload_form, UploadTooLargeError, TooManyFilesError, MalformedFormError
+)
+import asyncio
+import hashlib
+import json
 import logging
+import time
+import config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,11 +43,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Create database tables before anything else starts
+@app.on_event("startup")
+async def create_database_tables():
+    await create_tables(models.Base.metadata)
+
+# Uploads are classified together in micro-batches on a worker thread
+detection_scheduler = BatchScheduler(
+    run_registry_batch,
+    max_batch_size=config.DETECT_MAX_BATCH_SIZE,
+    max_wait_ms=config.DETECT_MAX_WAIT_MS,
+    max_queue_depth=config.DETECT_QUEUE_DEPTH
+)
+
+detection_cache = DetectionCache()
+label_table = LabelTable()
+
+# Retried requests that arrive while the original is running share its result
+chat_flight = SingleFlight()
+detection_flight = SingleFlight()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Startup jobs that run in the background, referenced until they finish
+startup_tasks = set()
+
+# Time from a streamed chat request to its first answer chunk
+chat_ttft = LatencyStats()
+
+@app.on_event("startup")
+async def load_detection_model():
+    # Load the classifier once per process instead of on every upload
+    try:
+        await run_in_threadpool(registry.load)
+    except RuntimeError as e:
+        logger.error(f"Disease model not loaded at startup: {str(e)}")
+    label_table.load()
+    detection_scheduler.start()
+    await translator.start()
+    if registry.loaded:
+        # Missing label tables are generated once; until then labels are translated per request
+        task = asyncio.create_task(build_missing_label_tables())
+        startup_tasks.add(task)
+        task.add_done_callback(startup_tasks.discard)
+
+async def build_missing_label_tables():
+    try:
+        await label_table.build_missing(registry.backend.id2label, config.CHAT_LANGUAGES, translator)
+    except Exception as e:
+        logger.error(f"Failed to build label tables: {str(e)}")
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await detection_scheduler.stop()
+    await translator.aclose()
+    password_hasher.shutdown()
+    await engine.dispose()
 
 # Pydantic models
 class FarmerContext(BaseModel):
@@ -72,42 +138,71 @@ class SaveDetectionRequest(BaseModel):
     confidence: float
 
 # Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# Password hashing and verification
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# Password hashing and verification, on the bcrypt thread pool
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Too many logins, please retry.", headers={"Retry-After": "1"})
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Too many logins, please retry.", headers={"Retry-After": "1"})
+
+# Session token dependency: the aadhar of a valid bearer token, or None without one
+def session_aadhar(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    if not authorization:
+        if config.REQUIRE_SESSION_TOKEN:
+            raise HTTPException(status_code=401, detail="Session token required")
+        return None
+    scheme, _, token = authorization.partition(" ")
+    aadhar = session_tokens.verify(token.strip()) if scheme.lower() == "bearer" else None
+    if aadhar is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    return aadhar
+
+def check_aadhar(session: Optional[str], aadhar: Optional[str]):
+    if session is not None and aadhar != session:
+        raise HTTPException(status_code=403, detail="Session does not belong to this Aadhar")
 
 @app.post("/api/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.aadhar == request.aadhar).first()
-    if not user or not verify_password(request.password, user.password):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.aadhar == request.aadhar))
+    if not user or not await verify_password(request.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid Aadhar or password")
-    return {"message": "Login successful", "aadhar": user.aadhar}
+    return {
+        "message": "Login successful",
+        "aadhar": user.aadhar,
+        "token": session_tokens.issue(user.aadhar),
+        "token_type": "bearer"
+    }
 
 @app.post("/api/register")
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.aadhar == request.aadhar).first()
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(models.User).where(models.User.aadhar == request.aadhar))
     if existing_user:
         raise HTTPException(status_code=400, detail="Aadhar already registered")
-    hashed_password = hash_password(request.password)
+    hashed_password = await hash_password(request.password)
     db_user = models.User(aadhar=request.aadhar, password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return {"message": "Registration successful", "aadhar": db_user.aadhar}
 
 @app.post("/api/farmer")
-async def save_farmer(context: FarmerContext, db: Session = Depends(get_db)):
-    existing_farmer = db.query(models.Farmer).filter(models.Farmer.aadhar == context.aadhar).first()
+async def save_farmer(
+    context: FarmerContext,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[str] = Depends(session_aadhar)
+):
+    check_aadhar(session, context.aadhar)
+    existing_farmer = await db.scalar(select(models.Farmer).where(models.Farmer.aadhar == context.aadhar))
     if existing_farmer:
         return {"message": "Farmer already exists", "aadhar": context.aadhar}
     db_farmer = models.Farmer(
@@ -125,40 +220,215 @@ async def save_farmer(context: FarmerContext, db: Session = Depends(get_db)):
         any_other_info=context.any_other_info
     )
     db.add(db_farmer)
-    db.commit()
-    db.refresh(db_farmer)
+    await db.commit()
+    await db.refresh(db_farmer)
     return {"message": "Farmer info saved", "aadhar": context.aadhar}
 
-@app.post("/api/upload")
-async def upload_image(
-    file: UploadFile = File(...),
-    aadhar: str = Form(None),
-    language: str = Form("en"),
-    db: Session = Depends(get_db)
-):
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+def image_too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Image too large. Maximum size is {config.MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    )
+
+async def read_image_form(request: Request, max_files: int):
+    """Stream the multipart body into memory, enforcing MAX_UPLOAD_BYTES as it arrives.
+
+    Nothing is spooled to temporary files, and a body that cannot fit is
+    rejected from its Content-Length (or as soon as it grows too big).
+    """
+    try:
+        return await read_upload_form(request, config.MAX_UPLOAD_BYTES, max_files)
+    except UploadTooLargeError:
+        raise image_too_large()
+    except TooManyFilesError:
+        raise HTTPException(status_code=400, detail=f"Too many images. Maximum is {max_files} per request.")
+    except MalformedFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def image_bytes_of(upload) -> bytes:
+    if not is_supported_image(upload.filename):
         raise HTTPException(status_code=400, detail="Invalid image format. Use PNG, JPG, or JPEG.")
-    file_path = f"temp_{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-    model_name = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
-    processor, model = load_model_and_processor(model_name)
-    if processor is None or model is None:
-        os.remove(file_path)
+    if upload.too_large:
+        raise image_too_large()
+    return upload.data
+
+def form_bool(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+async def classify_image(image_bytes: bytes):
+    """Return the ranked (disease, confidence) predictions for one uploaded image.
+
+    Identical images being classified at the same time share one prediction.
+    """
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return await detection_flight.do(digest, lambda: classify_image_uncoalesced(image_bytes))
+
+async def classify_image_uncoalesced(image_bytes: bytes):
+    """Check the detection cache, then decode off the event loop and queue the
+    image on the shared batch scheduler on a miss.
+    """
+    image = None
+    cache_key = None
+    cached = None
+    if detection_cache.enabled and not detection_cache.needs_pixels:
+        cache_key = detection_cache.key_for(image_bytes=image_bytes)
+        cached = await detection_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        await run_in_threadpool(registry.get)
+    except RuntimeError:
         raise HTTPException(status_code=500, detail="Failed to load model.")
-    predicted_class, confidence = predict_disease(file_path, processor, model, language)
-    os.remove(file_path)
-    if predicted_class is None:
+    try:
+        image = await run_in_threadpool(registry.preprocessor.load, image_bytes)
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=400, detail="Could not read image.")
+    if detection_cache.enabled and detection_cache.needs_pixels:
+        cache_key = detection_cache.key_for(image=image)
+        cached = await detection_cache.get(cache_key, image=image)
+        if cached is not None:
+            return cached
+    try:
+        predictions = await detection_scheduler.submit(image)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Detection service is busy, please retry.")
+    except Exception as e:
+        logger.error(f"Error predicting disease: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to predict disease.")
+    if cache_key is not None:
+        await detection_cache.set(cache_key, predictions, image=image)
+    return predictions
+
+async def localize_labels(labels, language: str) -> dict:
+    """Map raw disease labels to ``language``: from the label table, otherwise
+    translated for this request (English if that fails too)."""
+    language = normalize_language(language)
+    localized = {label: label_table.lookup(label, language) for label in set(labels)}
+    missing = [label for label, text in localized.items() if text is None]
+    if missing:
+        # Same input as build_table, so labels read the same before and after the table exists
+        display = [display_label(label) for label in missing]
+        translated = await translator.translate_texts(display, from_code="en", to_code=language)
+        localized.update(
+            (label, label if text == shown else text)
+            for label, shown, text in zip(missing, display, translated)
+        )
+    return localized
+
+def is_supported_image(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+
+@app.post("/api/upload")
+async def upload_image(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[str] = Depends(session_aadhar)
+):
+    # Form fields: file, aadhar, language
+    form = await read_image_form(request, max_files=1)
+    aadhar = form.get("aadhar")
+    language = form.get("language", "en")
+    check_aadhar(session, aadhar)
+    files = form.files_for("file")
+    if not files:
+        raise HTTPException(status_code=422, detail="Missing image file.")
+    image_bytes = image_bytes_of(files[0])
+    predicted_class, confidence = (await classify_image(image_bytes))[0]
+    localized = await localize_labels([predicted_class], language)
     return {
-        "disease": predicted_class,
+        "disease": localized[predicted_class],
         "confidence": float(confidence),
         "aadhar": aadhar
     }
 
+@app.post("/api/upload/batch")
+async def upload_images_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[str] = Depends(session_aadhar)
+):
+    # Form fields: files (repeated), aadhar, language, top_k, save
+    form = await read_image_form(request, max_files=config.MAX_BATCH_UPLOAD_FILES)
+    aadhar = form.get("aadhar")
+    language = form.get("language", "en")
+    save = form_bool(form.get("save"))
+    try:
+        top_k = int(form.get("top_k", 3))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="top_k must be an integer.")
+    check_aadhar(session, aadhar)
+    files = form.files_for("files")
+    if not files:
+        raise HTTPException(status_code=422, detail="Missing image files.")
+    if detection_scheduler.free_slots() < len(files):
+        raise HTTPException(status_code=503, detail="Detection service is busy, please retry.")
+    top_k = max(1, min(top_k, config.DETECT_TOP_K))
+
+    async def detect_one(upload):
+        return await classify_image(image_bytes_of(upload))
+
+    # Images are decoded in parallel and coalesced by the scheduler into batched forward passes
+    outcomes = await asyncio.gather(*(detect_one(f) for f in files), return_exceptions=True)
+
+    # Each distinct label is localized once per batch
+    localized = await localize_labels([
+        label
+        for outcome in outcomes if not isinstance(outcome, Exception)
+        for label, _ in outcome[:top_k]
+    ], language)
+
+    results = []
+    detections = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, HTTPException):
+            results.append({"filename": file.filename, "error": outcome.detail})
+            continue
+        if isinstance(outcome, Exception):
+            logger.error(f"Error detecting {file.filename}: {str(outcome)}")
+            results.append({"filename": file.filename, "error": "Failed to predict disease."})
+            continue
+        ranked = [(localized[label], conf) for label, conf in outcome[:top_k]]
+        disease, confidence = ranked[0]
+        results.append({
+            "filename": file.filename,
+            "disease": disease,
+            "confidence": float(confidence),
+            "top_k": [
+                {"disease": label, "confidence": float(conf)} for label, conf in ranked
+            ]
+        })
+        detections.append(models.DetectionResult(
+            aadhar=aadhar, disease=disease, confidence=float(confidence)
+        ))
+
+    saved = False
+    if save and aadhar and detections:
+        try:
+            # One transaction for the whole survey
+            db.add_all(detections)
+            await db.commit()
+            saved = True
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error saving batch detections: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to save detections: {str(e)}")
+
+    return {
+        "aadhar": aadhar,
+        "count": len(results),
+        "saved": saved,
+        "results": results
+    }
+
 @app.post("/api/save_detection")
-async def save_detection(request: SaveDetectionRequest, db: Session = Depends(get_db)):
+async def save_detection(
+    request: SaveDetectionRequest,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[str] = Depends(session_aadhar)
+):
     logger.info(f"Received save_detection request: {request.dict()}")
+    check_aadhar(session, request.aadhar)
     try:
         if not request.aadhar or not request.disease or not isinstance(request.confidence, float):
             raise HTTPException(
@@ -171,8 +441,8 @@ async def save_detection(request: SaveDetectionRequest, db: Session = Depends(ge
             confidence=request.confidence
         )
         db.add(db_detection)
-        db.commit()
-        db.refresh(db_detection)
+        await db.commit()
+        await db.refresh(db_detection)
         logger.info(f"Detection saved for aadhar: {request.aadhar}")
         return {
             "message": "Detection saved",
@@ -184,34 +454,124 @@ async def save_detection(request: SaveDetectionRequest, db: Session = Depends(ge
         logger.error(f"Error saving detection: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to save detection: {str(e)}")
 
+def llm_busy(error: GatewayBusyError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The advisor is busy, please retry shortly.",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @app.post("/api/chat")
-async def chat_query(query: ChatQuery, db: Session = Depends(get_db)):
+async def chat_query(query: ChatQuery, session: Optional[str] = Depends(session_aadhar)):
+    check_aadhar(session, query.context.aadhar)
+    context = query.context.dict()
+    key = fingerprint(query.context.aadhar, query.question, query.language, context)
+
+    async def answer():
+        response = await run_plant_disease_chatbot(context, query.question, query.language)
+        await save_chat_interaction(query.context.aadhar, query.question, response)
+        return response
+
     try:
-        response = run_plant_disease_chatbot(query.context.dict(), query.question, query.language)
-        db_chat = models.ChatInteraction(
-            aadhar=query.context.aadhar,
-            question=query.question,
-            answer=response
-        )
-        db.add(db_chat)
-        db.commit()
-        db.refresh(db_chat)
+        # A retried duplicate gets the same answer, generated and saved once
+        response = await chat_flight.do(key, answer)
         return {
             "question": query.question,
             "answer": response,
             "aadhar": query.context.aadhar
         }
+    except GatewayBusyError as e:
+        raise llm_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
 
+async def save_chat_interaction(aadhar: Optional[str], question: str, answer: str):
+    # Own session: the request's get_db session may be closed before a stream
+    # or a coalesced chat finishes
+    async with AsyncSessionLocal() as db:
+        try:
+            db.add(models.ChatInteraction(aadhar=aadhar, question=question, answer=answer))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error saving chat for {aadhar}: {str(e)}")
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(query: ChatQuery, session: Optional[str] = Depends(session_aadhar)):
+    """Server-Sent Events version of /api/chat.
+
+    Emits ``data: {"delta": ...}`` events as the answer is generated, then an
+    ``event: done`` with the full answer once it has been saved.
+    """
+    check_aadhar(session, query.context.aadhar)
+    started = time.perf_counter()
+    deltas = stream_plant_disease_chatbot(query.context.dict(), query.question, query.language)
+    # Wait for the first piece here so a busy model is still a plain 503
+    try:
+        first = await deltas.__anext__()
+    except GatewayBusyError as e:
+        raise llm_busy(e)
+    except StopAsyncIteration:
+        first = ""
+    chat_ttft.record(time.perf_counter() - started)
+
+    async def events():
+        answer = first
+        if first:
+            yield sse_event({"delta": first})
+        async for delta in deltas:
+            answer += delta
+            yield sse_event({"delta": delta})
+        await save_chat_interaction(query.context.aadhar, query.question, answer)
+        yield sse_event({
+            "question": query.question,
+            "answer": answer,
+            "aadhar": query.context.aadhar
+        }, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/history")
-async def get_history(request: ChatHistoryRequest, db: Session = Depends(get_db)):
+async def get_history(
+    request: ChatHistoryRequest,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[str] = Depends(session_aadhar)
+):
+    check_aadhar(session, request.aadhar)
     logger.info(f"Fetching history for aadhar: {request.aadhar}")
-    farmer = db.query(models.Farmer).filter(models.Farmer.aadhar == request.aadhar).first()
-    detections = db.query(models.DetectionResult).filter(models.DetectionResult.aadhar == request.aadhar).all()
-    chats = db.query(models.ChatInteraction).filter(models.ChatInteraction.aadhar == request.aadhar).all()
+    farmer = await db.scalar(select(models.Farmer).where(models.Farmer.aadhar == request.aadhar))
+    detections = (await db.scalars(
+        select(models.DetectionResult).where(models.DetectionResult.aadhar == request.aadhar)
+    )).all()
+    chats = (await db.scalars(
+        select(models.ChatInteraction).where(models.ChatInteraction.aadhar == request.aadhar)
+    )).all()
     return {
         "farmer": farmer.__dict__ if farmer else None,
         "detections": [d.__dict__ for d in detections],
         "chats": [c.__dict__ for c in chats]
-    }
\ No newline at end of file
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return {
+        "model": registry.stats(),
+        "detection_queue": detection_scheduler.stats(),
+        "detection_cache": detection_cache.stats(),
+        "labels": label_table.stats(),
+        "translator": translator.stats(),
+        "chat_memory": memory_store.stats(),
+        "chat_stream": {"ttft": chat_ttft.stats()},
+        "llm_gateway": llm_gateway.stats(),
+        "answer_cache": answer_cache.stats(),
+        "single_flight": {"chat": chat_flight.stats(), "detection": detection_flight.stats()},
+        "password_hasher": password_hasher.stats()
+    }
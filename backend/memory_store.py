@@ -0,0 +1,166 @@
+import logging
+from collections import OrderedDict
+
+from config import (
+    CHAT_MAX_SESSIONS, CHAT_MAX_TURNS, CHAT_MAX_HISTORY_TOKENS, CHAT_SUMMARY_MAX_TOKENS
+)
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from prompt_builder import count_tokens
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSession:
+    """Recent turns kept verbatim plus a running summary of everything older."""
+
+    def __init__(self, turns=None):
+        self.turns = list(turns or [])
+        self.summary = ""
+        # Turns pushed out of the window that are not yet folded into the summary
+        self.pending = []
+        self.compacting = False
+
+    def history_tokens(self):
+        return sum(count_tokens(q) + count_tokens(a) for q, a in self.turns)
+
+
+class SessionMemoryStore:
+    """Per-farmer chat history, keyed by aadhar.
+
+    At most ``max_sessions`` sessions are kept in memory (least recently used
+    are evicted). Each keeps its last ``max_turns`` turns within ``max_tokens``;
+    older turns are folded into a cached running summary by ``compact`` so the
+    prompt stays bounded however long a farmer has been chatting. Turns are
+    also saved in English as ChatMemoryTurn rows (ChatInteraction holds what
+    the farmer saw, possibly translated), and an evicted farmer's history is
+    rebuilt lazily from them.
+    """
+
+    def __init__(self, max_sessions=CHAT_MAX_SESSIONS, max_turns=CHAT_MAX_TURNS,
+                 max_tokens=CHAT_MAX_HISTORY_TOKENS, summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self._sessions = OrderedDict()
+        self.rehydrations = 0
+        self.evictions = 0
+        self.summaries = 0
+
+    async def get_history(self, aadhar):
+        """Return ``(summary, turns)`` for the farmer, turns oldest first."""
+        if not aadhar:
+            return "", []
+        session = self._sessions.get(aadhar)
+        if session is None:
+            rows = await self._load(aadhar)
+            # Another request may have rebuilt the session while the rows loaded
+            session = self._sessions.get(aadhar)
+            if session is None:
+                session = ChatSession(rows)
+                self._store(aadhar, session)
+                self.rehydrations += 1
+        self._sessions.move_to_end(aadhar)
+        return session.summary, self._window(session.turns)
+
+    async def has_history(self, aadhar):
+        """True once the farmer has any earlier turns (or a summary of them)."""
+        summary, turns = await self.get_history(aadhar)
+        return bool(summary or turns)
+
+    def append(self, aadhar, question, answer):
+        """Record a turn; returns True when older turns are waiting to be summarized."""
+        if not aadhar:
+            return False
+        session = self._sessions.get(aadhar)
+        if session is None:
+            session = ChatSession()
+            self._store(aadhar, session)
+        session.turns.append((question, answer))
+        self._sessions.move_to_end(aadhar)
+        while len(session.turns) > 1 and (
+            len(session.turns) > self.max_turns or session.history_tokens() > self.max_tokens
+        ):
+            session.pending.append(session.turns.pop(0))
+        # Bound the backlog if summarization keeps failing
+        del session.pending[:-self.max_turns]
+        return bool(session.pending)
+
+    async def save(self, aadhar, question, answer):
+        """Persist an English turn so the history survives eviction and restarts."""
+        if not aadhar:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(models.ChatMemoryTurn(aadhar=aadhar, question=question, answer=answer))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to save chat memory for {aadhar}: {str(e)}")
+
+    async def compact(self, aadhar, summarize):
+        """Fold pending turns into the session summary.
+
+        ``summarize(previous_summary, turns, max_tokens)`` is an async callable
+        returning the new summary text.
+        """
+        session = self._sessions.get(aadhar)
+        if session is None or not session.pending or session.compacting:
+            return
+        session.compacting = True
+        turns = session.pending
+        session.pending = []
+        try:
+            summary = await summarize(session.summary, turns, self.summary_max_tokens)
+            session.summary = summary.strip()
+            self.summaries += 1
+        except Exception as e:
+            logger.error(f"Failed to summarize chat history for {aadhar}: {str(e)}")
+            session.pending = turns + session.pending
+        finally:
+            session.compacting = False
+
+    def _store(self, aadhar, session):
+        self._sessions[aadhar] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _window(self, turns):
+        """Most recent turns that fit in max_tokens (always at least the last one)."""
+        window = []
+        total = 0
+        for question, answer in reversed(turns):
+            total += count_tokens(question) + count_tokens(answer)
+            if window and total > self.max_tokens:
+                break
+            window.append((question, answer))
+        window.reverse()
+        return window
+
+    async def _load(self, aadhar):
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.scalars(
+                    select(models.ChatMemoryTurn)
+                    .where(models.ChatMemoryTurn.aadhar == aadhar)
+                    .order_by(models.ChatMemoryTurn.id.desc())
+                    .limit(self.max_turns)
+                )).all()
+            return [(row.question, row.answer) for row in reversed(rows)]
+        except Exception as e:
+            logger.error(f"Failed to load chat history for {aadhar}: {str(e)}")
+            return []
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+            "max_tokens": self.max_tokens,
+            "rehydrations": self.rehydrations,
+            "evictions": self.evictions,
+            "summaries": self.summaries,
+        }
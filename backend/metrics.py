@@ -0,0 +1,48 @@
+import random
+import threading
+
+
+class LatencyStats:
+    """Count, mean and percentiles of a latency, from a bounded random sample."""
+
+    def __init__(self, sample_size=1024):
+        self.sample_size = sample_size
+        self.count = 0
+        self.total = 0.0
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if len(self._samples) < self.sample_size:
+                self._samples.append(seconds)
+            else:
+                # Reservoir sampling keeps a uniform sample of every observation
+                index = random.randrange(self.count)
+                if index < self.sample_size:
+                    self._samples[index] = seconds
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100.0 * len(samples)))]
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "mean_ms": _ms(self.mean()),
+            "p50_ms": _ms(self.percentile(50)),
+            "p95_ms": _ms(self.percentile(95)),
+            "p99_ms": _ms(self.percentile(99)),
+        }
+
+
+def _ms(seconds):
+    return seconds * 1000 if seconds is not None else None
@@ -37,4 +37,19 @@ class ChatInteraction(Base):
     id = Column(Integer, primary_key=True, index=True)
     aadhar = Column(String, index=True)
     question = Column(Text)
-    answer = Column(Text)
\ No newline at end of file
+    answer = Column(Text)
+
+class ChatMemoryTurn(Base):
+    """A chat turn in English, as the chatbot saw it; rebuilds evicted chat memory."""
+    __tablename__ = "chat_memory_turns"
+    id = Column(Integer, primary_key=True, index=True)
+    aadhar = Column(String, index=True)
+    question = Column(Text)
+    answer = Column(Text)
+
+class DetectionCacheEntry(Base):
+    __tablename__ = "detection_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True)
+    predictions = Column(Text)
+    created_at = Column(Float)
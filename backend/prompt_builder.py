@@ -0,0 +1,48 @@
+import json
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Identifiers that cost tokens but tell the model nothing about the crop
+EXCLUDED_CONTEXT_FIELDS = ("aadhar",)
+
+
+def count_tokens(text):
+    """Cheap approximation of the LLM token count (words and punctuation)."""
+    return len(TOKEN_PATTERN.findall(text or ""))
+
+
+def compact_context(context):
+    """Farmer context as compact JSON without empty, null or identifier fields."""
+    if not isinstance(context, dict):
+        return context or ""
+    fields = {
+        key: value.strip() if isinstance(value, str) else value
+        for key, value in context.items()
+        if key not in EXCLUDED_CONTEXT_FIELDS
+        and value is not None
+        and not (isinstance(value, str) and not value.strip())
+    }
+    if not fields:
+        return ""
+    return "Farmer Context: " + json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+
+
+def format_history(summary, turns):
+    """Running summary of older turns followed by the recent turns verbatim."""
+    lines = []
+    if summary:
+        lines.append(f"Summary of earlier conversation: {summary}")
+    for question, answer in turns:
+        lines.append(f"Farmer: {question}\nAdvisor: {answer}")
+    return "\n".join(lines)
+
+
+def build_prompt_inputs(context, question, summary="", turns=()):
+    """Inputs for the advisor prompt plus their approximate token count."""
+    inputs = {
+        "farmer_context": compact_context(context),
+        "chat_history": format_history(summary, turns),
+        "question": question,
+    }
+    return inputs, sum(count_tokens(value) for value in inputs.values())
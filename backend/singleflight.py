@@ -0,0 +1,48 @@
+import asyncio
+import hashlib
+import json
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serializable request parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Runs one coroutine per key at a time; concurrent callers share its result.
+
+    Duplicate requests that arrive while the first is still running await the
+    same task instead of repeating the work. The task is shielded, so a caller
+    that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, make_coroutine):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(make_coroutine())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
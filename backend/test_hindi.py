@@ -1,45 +1,229 @@
 import requests
+import httpx
+import asyncio
 import logging
+import time
+from translate.translation_cache import TranslationCache
+from config import (
+    TRANSLATE_URL, TRANSLATE_TIMEOUT, TRANSLATE_MAX_CONCURRENCY, TRANSLATE_RETRIES,
+    TRANSLATE_BACKOFF, TRANSLATE_BREAKER_THRESHOLD, TRANSLATE_BREAKER_RESET
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_translated_text_hindi(text, from_code="en", to_code="hi"):
-    url = "http://localhost:8100/hindi"
+# Shared with the translation service; keyed on the model version it reports
+translation_cache = TranslationCache()
+model_versions = {}
+
+async def _cached_translations(texts, from_code, to_code):
+    """Cached translation for each text (None where missing) and the distinct misses.
+
+    The SQLite store is read off the event loop.
+    """
+    version = model_versions.get((from_code, to_code))
+    if version is None:
+        results = [None] * len(texts)
+    else:
+        results = await translation_cache.get_many(texts, from_code, to_code, version)
+    missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+    return results, missing
+
+def _remember(from_code, to_code, data, translated):
+    version = data.get("model_version")
+    if version is not None:
+        model_versions[(from_code, to_code)] = version
+        for text, result in translated.items():
+            translation_cache.set(text, from_code, to_code, version, result)
+
+def _merge(texts, results, translated):
+    return [translated.get(text, text) if result is None else result for text, result in zip(texts, results)]
+
+def _translate(url, text, from_code, to_code, direction):
     payload = {
         "text": text,
         "from_code": from_code,
         "to_code": to_code
     }
     try:
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, timeout=TRANSLATE_TIMEOUT)
         response.raise_for_status()
         return response.json().get("translated_text", text)
     except requests.exceptions.ConnectionError as e:
         logger.error(f"Failed to connect to translation service at {url}: {str(e)}")
         return text
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error during Hindi translation request: {str(e)}")
+        logger.error(f"Error during {direction} translation request: {str(e)}")
         return text
 
+def get_translated_text_hindi(text, from_code="en", to_code="hi"):
+    return _translate(f"{TRANSLATE_URL}/hindi", text, from_code, to_code, "Hindi")
+
 def get_translated_text_english(text, from_code="hi", to_code="en"):
-    url = "http://localhost:8100/english"
-    payload = {
-        "text": text,
-        "from_code": from_code,
-        "to_code": to_code
-    }
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json().get("translated_text", text)
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Failed to connect to translation service at {url}: {str(e)}")
-        return text
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error during English translation request: {str(e)}")
-        return text
+    return _translate(f"{TRANSLATE_URL}/english", text, from_code, to_code, "English")
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are refused until ``reset_timeout`` seconds have passed;
+    then a single trial call is let through (half-open) and its outcome either
+    closes the breaker again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=TRANSLATE_BREAKER_THRESHOLD, reset_timeout=TRANSLATE_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def end_trial(self):
+        """Give up the half-open trial without an outcome (e.g. the call was cancelled)."""
+        self.trial_in_flight = False
+
+class TranslationRejected(Exception):
+    """The service answered the request with a 4xx; it is up but refused this input."""
+
+class AsyncTranslationClient:
+    """Non-blocking client for the translation service.
+
+    Uses one pooled keep-alive connection set, bounds in-flight requests,
+    retries transient failures with exponential backoff and, through a circuit
+    breaker, falls back to the untranslated text immediately while the
+    service is down.
+    """
+
+    def __init__(self, base_url=TRANSLATE_URL, timeout=TRANSLATE_TIMEOUT,
+                 max_concurrency=TRANSLATE_MAX_CONCURRENCY, retries=TRANSLATE_RETRIES,
+                 backoff=TRANSLATE_BACKOFF):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker()
+        self._client = None
+        self._semaphore = None
+        self.requests = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _post(self, path, payload):
+        client = self._http()
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    response = await client.post(path, json=payload)
+                if response.status_code >= 500:
+                    error = httpx.HTTPStatusError(
+                        f"Server error {response.status_code}", request=response.request, response=response
+                    )
+                elif response.status_code >= 400:
+                    # Retrying the same input won't help, and the service is not down
+                    raise TranslationRejected(f"{response.status_code}: {response.text}")
+                else:
+                    return response.json()
+            except httpx.TransportError as e:
+                error = e
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+    async def translate_texts(self, texts, from_code="hi", to_code="en"):
+        """Translate several texts in one request; untranslated texts are returned on failure."""
+        results, missing = await _cached_translations(texts, from_code, to_code)
+        if not missing:
+            return results
+        if not self.breaker.allow():
+            self.fallbacks += 1
+            return _merge(texts, results, {})
+        # Only the half-open trial call holds this; it must be handed back however the call ends
+        trial = self.breaker.trial_in_flight
+        try:
+            data = await self._post("/translate/batch", {
+                "texts": missing,
+                "from_code": from_code,
+                "to_code": to_code
+            })
+            self.breaker.record_success()
+        except TranslationRejected as e:
+            self.fallbacks += 1
+            logger.warning(f"Translation {from_code}->{to_code} rejected, using original text: {str(e)}")
+            return _merge(texts, results, {})
+        except (httpx.HTTPError, ValueError) as e:
+            self.failures += 1
+            self.fallbacks += 1
+            self.breaker.record_failure()
+            logger.error(f"Translation {from_code}->{to_code} failed, using original text: {str(e)}")
+            return _merge(texts, results, {})
+        finally:
+            if trial:
+                self.breaker.end_trial()
+        translated = dict(zip(missing, data.get("translated_texts", missing)))
+        _remember(from_code, to_code, data, translated)
+        return _merge(texts, results, translated)
+
+    async def translate(self, text, from_code="en", to_code="hi"):
+        return (await self.translate_texts([text], from_code, to_code))[0]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "breaker": self.breaker.state,
+            "max_concurrency": self.max_concurrency,
+        }
+
+translation_client = AsyncTranslationClient()
 
 if __name__ == "__main__":
     text = "Irrigation is vital for crop production."
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Modules are imported from the backend directory, as when running uvicorn there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep caches in memory so tests don't write SQLite files into the working directory
+os.environ.setdefault("TRANSLATION_CACHE_PATH", "")
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+pytest.importorskip("passlib")
+
+from auth import SessionTokens
+
+
+def test_token_round_trip():
+    tokens = SessionTokens(secret="secret", ttl=60)
+    assert tokens.verify(tokens.issue("123412341234")) == "123412341234"
+
+
+@pytest.mark.parametrize("token", ["", "garbage", "a.b.c", "abc.é", "é.abc", "abc.", ".abc"])
+def test_malformed_tokens_are_rejected(token):
+    assert SessionTokens(secret="secret").verify(token) is None
+
+
+def test_tampered_and_foreign_tokens_are_rejected():
+    tokens = SessionTokens(secret="secret")
+    token = tokens.issue("123412341234")
+    payload, signature = token.split(".")
+    assert tokens.verify(f"{payload}x.{signature}") is None
+    assert SessionTokens(secret="other").verify(token) is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    tokens = SessionTokens(secret="secret", ttl=60)
+    token = tokens.issue("123412341234")
+    monkeypatch.setattr(time, "time", lambda: 10 ** 12)
+    assert tokens.verify(token) is None
+
+
+def test_required_tokens_need_a_secret():
+    with pytest.raises(RuntimeError):
+        SessionTokens(secret="", required=True)
+    assert SessionTokens(secret="", required=False).verify("abc.def") is None
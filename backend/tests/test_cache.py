@@ -0,0 +1,40 @@
+from cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=4, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    now[0] += 30
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_zero_size_disables_the_cache():
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a", "default") == "default"
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
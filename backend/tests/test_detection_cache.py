@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("aiosqlite")
+
+from detection_cache import DetectionCache, perceptual_hash
+
+
+def leaf(seed):
+    """Blotchy 224x224 test image (pure noise would average out to flat gray)."""
+    rng = np.random.default_rng(seed)
+    patches = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    return patches.repeat(28, axis=0).repeat(28, axis=1)
+
+
+def test_phash_is_256_bits_and_stable_under_small_changes():
+    image = leaf(0)
+    brighter = np.clip(image.astype(np.int16) + 3, 0, 255).astype(np.uint8)
+    assert len(perceptual_hash(image)) == 64
+    assert perceptual_hash(image) == perceptual_hash(image.copy())
+    assert perceptual_hash(image) != perceptual_hash(leaf(1))
+    differing = bin(int(perceptual_hash(image), 16) ^ int(perceptual_hash(brighter), 16)).count("1")
+    assert differing < 16
+
+
+def test_phash_hit_requires_a_matching_thumbnail():
+    cache = DetectionCache(key_mode="phash", persist=False)
+    image = leaf(0)
+    key = cache.key_for(image=image)
+    predictions = [("Tomato___Late_blight", 0.9)]
+
+    async def main():
+        await cache.set(key, predictions, image=image)
+        same = await cache.get(key, image=image.copy())
+        # A different photo that happened to hash to the same key
+        other = await cache.get(key, image=leaf(1))
+        return same, other
+
+    assert asyncio.run(main()) == (predictions, None)
+    assert cache.collisions == 1
+
+
+def test_sha256_mode_keys_on_bytes():
+    cache = DetectionCache(key_mode="sha256", persist=False)
+    key = cache.key_for(image_bytes=b"jpeg bytes")
+
+    async def main():
+        await cache.set(key, [("Tomato___healthy", 0.8)])
+        return await cache.get(key)
+
+    assert asyncio.run(main()) == [("Tomato___healthy", 0.8)]
+    assert cache.key_for(image_bytes=b"other bytes") != key
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from labels import LabelTable, LabelTranslationError, build_table, table_path, write_table
+
+ID2LABEL = {"0": "Tomato___Late_blight", "1": "Tomato___healthy"}
+
+
+class EchoTranslator:
+    """Behaves like a Translator whose service is down: returns the input."""
+
+    async def translate_texts(self, texts, from_code="en", to_code="hi"):
+        return list(texts)
+
+
+class FakeHindiTranslator:
+    async def translate_texts(self, texts, from_code="en", to_code="hi"):
+        return [f"hi:{text}" for text in texts]
+
+
+def test_build_table_translates_display_labels():
+    labels = asyncio.run(build_table(ID2LABEL, "hi", FakeHindiTranslator()))
+    assert labels == {
+        "Tomato___Late_blight": "hi:Tomato Late blight",
+        "Tomato___healthy": "hi:Tomato healthy",
+    }
+
+
+def test_build_table_rejects_untranslated_labels():
+    with pytest.raises(LabelTranslationError):
+        asyncio.run(build_table(ID2LABEL, "hi", EchoTranslator()))
+
+
+def test_load_ignores_untranslated_table(tmp_path):
+    write_table("model", "hi", {"Tomato___healthy": "Tomato healthy"}, str(tmp_path))
+    table = LabelTable(model_name="model", labels_dir=str(tmp_path))
+    assert table.load() == []
+    assert table.lookup("Tomato___healthy", "hi") is None
+    assert table.translate("Tomato___healthy", "hi") == "Tomato___healthy"
+
+
+def test_build_missing_writes_and_serves_tables(tmp_path):
+    table = LabelTable(model_name="model", labels_dir=str(tmp_path))
+    built = asyncio.run(table.build_missing(ID2LABEL, ["en", "hi"], FakeHindiTranslator()))
+    assert built == ["hi"]
+    assert table.lookup("Tomato___healthy", "hi") == "hi:Tomato healthy"
+    with open(table_path("model", "hi", str(tmp_path)), encoding="utf-8") as f:
+        assert json.load(f)["labels"]["Tomato___healthy"] == "hi:Tomato healthy"
+
+
+def test_build_missing_skips_failed_languages(tmp_path):
+    table = LabelTable(model_name="model", labels_dir=str(tmp_path))
+    assert asyncio.run(table.build_missing(ID2LABEL, ["hi"], EchoTranslator())) == []
+    assert not list(tmp_path.iterdir())
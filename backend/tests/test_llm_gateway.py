@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import GatewayBusyError, LLMGateway
+
+
+def test_slots_are_limited_and_released():
+    gateway = LLMGateway(max_concurrency=2, max_queue_depth=10, max_wait=5, default_generation_seconds=0.01)
+    running = []
+    peak = []
+
+    async def generate():
+        async with gateway.slot("farmer"):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def main():
+        await asyncio.gather(*(generate() for _ in range(5)))
+
+    asyncio.run(main())
+    assert max(peak) == 2
+    assert gateway.stats()["active"] == 0
+    assert gateway.admitted == 5
+
+
+def test_waiting_farmers_are_served_round_robin():
+    gateway = LLMGateway(max_concurrency=1, max_queue_depth=10, max_wait=5, default_generation_seconds=0.01)
+    order = []
+
+    async def generate(farmer):
+        async with gateway.slot(farmer):
+            order.append(farmer)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with gateway.slot("first"):
+            tasks = [asyncio.ensure_future(generate(f)) for f in ["a", "a", "a", "b"]]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "a", "a"]
+
+
+def test_full_queue_is_rejected():
+    gateway = LLMGateway(max_concurrency=1, max_queue_depth=1, max_wait=5, default_generation_seconds=0.01)
+
+    async def main():
+        async with gateway.slot("a"):
+            waiting = asyncio.ensure_future(gateway.slot("b").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(GatewayBusyError) as busy:
+                async with gateway.slot("c"):
+                    pass
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+        return busy.value
+
+    error = asyncio.run(main())
+    assert error.retry_after >= 1
+    assert gateway.rejected == 1
+    assert gateway.stats()["queue_depth"] == 0
+
+
+def test_queued_request_times_out():
+    gateway = LLMGateway(max_concurrency=1, max_queue_depth=5, max_wait=0.05,
+                         default_generation_seconds=0.01)
+
+    async def main():
+        async with gateway.slot("a"):
+            with pytest.raises(GatewayBusyError):
+                async with gateway.slot("b"):
+                    pass
+            assert gateway.stats()["queue_depth"] == 0
+
+    asyncio.run(main())
+    assert gateway.timed_out == 1
+    assert gateway.stats()["active"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    gateway = LLMGateway(max_concurrency=1, max_queue_depth=5, max_wait=5, default_generation_seconds=0.01)
+
+    async def main():
+        async with gateway.slot("a"):
+            waiter = asyncio.ensure_future(gateway.slot("b").__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert gateway.stats()["queue_depth"] == 0
+
+    asyncio.run(main())
+    assert gateway.stats()["active"] == 0
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("aiosqlite")
+
+from memory_store import SessionMemoryStore
+
+
+def test_append_keeps_the_last_turns():
+    store = SessionMemoryStore(max_sessions=4, max_turns=2, max_tokens=1000)
+    assert store.append("farmer", "q1", "a1") is False
+    assert store.append("farmer", "q2", "a2") is False
+    assert store.append("farmer", "q3", "a3") is True
+    session = store._sessions["farmer"]
+    assert session.turns == [("q2", "a2"), ("q3", "a3")]
+    assert session.pending == [("q1", "a1")]
+
+
+def test_append_respects_the_token_budget():
+    store = SessionMemoryStore(max_sessions=4, max_turns=10, max_tokens=6)
+    store.append("farmer", "one two three", "four five")
+    store.append("farmer", "six seven", "eight nine")
+    session = store._sessions["farmer"]
+    assert session.turns == [("six seven", "eight nine")]
+    assert session.pending == [("one two three", "four five")]
+
+
+def test_a_single_long_turn_is_kept():
+    store = SessionMemoryStore(max_sessions=4, max_turns=10, max_tokens=1)
+    assert store.append("farmer", "a long question", "a long answer") is False
+    assert store._sessions["farmer"].turns == [("a long question", "a long answer")]
+
+
+def test_anonymous_turns_are_not_stored():
+    store = SessionMemoryStore()
+    assert store.append(None, "q", "a") is False
+    assert store.append("", "q", "a") is False
+    assert not store._sessions
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionMemoryStore(max_sessions=2)
+    for farmer in ["a", "b", "c"]:
+        store.append(farmer, "q", "a")
+    assert list(store._sessions) == ["b", "c"]
+    assert store.evictions == 1
+
+
+def test_pending_backlog_is_bounded():
+    store = SessionMemoryStore(max_sessions=4, max_turns=2, max_tokens=1000)
+    for i in range(10):
+        store.append("farmer", f"q{i}", f"a{i}")
+    assert len(store._sessions["farmer"].pending) == 2
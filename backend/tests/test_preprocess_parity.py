@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+Image = pytest.importorskip("PIL.Image")
+
+from detect import FastPreprocessor, preprocess_image
+
+# Built from their default configs, so no model download is needed
+PROCESSORS = ["MobileNetV2ImageProcessor", "ViTImageProcessor"]
+
+
+def make_jpeg(width, height):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("name", PROCESSORS)
+@pytest.mark.parametrize("size", [(640, 480), (300, 500)])
+def test_fast_preprocessor_matches_processor(name, size):
+    processor = getattr(transformers, name)()
+    image = make_jpeg(*size)
+    reference = preprocess_image(image, processor)["pixel_values"].numpy()
+
+    exact = FastPreprocessor.from_processor(processor, jpeg_draft=False)
+    draft = FastPreprocessor.from_processor(processor, jpeg_draft=True)
+    # Same tolerances as `benchmark.py parity`
+    assert np.abs(exact([image]).numpy() - reference).max() <= 1e-4
+    assert np.abs(draft([image]).numpy() - reference).mean() <= 0.05
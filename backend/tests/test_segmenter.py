@@ -0,0 +1,30 @@
+import pytest
+
+from translate.segmenter import join_text, split_text
+
+
+def test_sentences_are_split_and_layout_kept():
+    layout, sentences = split_text("## Treatment\n\n- Remove leaves. Spray neem oil!\n1. Water less")
+    assert sentences == ["Treatment", "Remove leaves.", "Spray neem oil!", "Water less"]
+    assert layout == [("## ", 1), ("", 0), ("- ", 2), ("1. ", 1)]
+
+
+def test_devanagari_full_stop_ends_a_sentence():
+    assert split_text("पत्ते हटाएं। पानी कम दें")[1] == ["पत्ते हटाएं।", "पानी कम दें"]
+
+
+@pytest.mark.parametrize("text", [
+    "Plain sentence.",
+    "First. Second? Third!",
+    "* one\n* two\n\n> quoted line",
+    "  indented\n\n\n",
+    "",
+])
+def test_join_restores_the_text(text):
+    assert join_text(*split_text(text)) == text
+
+
+def test_join_uses_translated_sentences():
+    layout, sentences = split_text("- Spots. Yellow leaves.\n- Wilting.")
+    translated = [s.upper() for s in sentences]
+    assert join_text(layout, translated) == "- SPOTS. YELLOW LEAVES.\n- WILTING."
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight, fingerprint
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["answer"] * 3
+    assert len(runs) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 2}
+
+
+def test_errors_reach_every_caller_and_are_not_remembered():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def main():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        async def ok():
+            return "ok"
+        return await flight.do("key", ok)
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_fingerprint_is_stable_across_key_order():
+    assert fingerprint({"a": 1, "b": 2}, "q") == fingerprint({"b": 2, "a": 1}, "q")
+    assert fingerprint({"a": 1}, "q") != fingerprint({"a": 1}, "other")
@@ -0,0 +1,34 @@
+import asyncio
+
+from translate.translation_cache import TranslationCache
+
+
+def test_set_is_written_to_the_store_in_the_background(tmp_path):
+    path = str(tmp_path / "translations.db")
+    cache = TranslationCache(path=path)
+    cache.set("hello", "en", "hi", "1.0", "नमस्ते")
+    cache.flush()
+
+    reopened = TranslationCache(path=path)
+    assert reopened.get("hello", "en", "hi", "1.0") == "नमस्ते"
+    assert reopened.store_hits == 1
+
+
+def test_get_many_reads_memory_and_store(tmp_path):
+    path = str(tmp_path / "translations.db")
+    writer = TranslationCache(path=path)
+    writer.set("stored", "en", "hi", "1.0", "S")
+    writer.flush()
+
+    cache = TranslationCache(path=path)
+    cache.set("memory", "en", "hi", "1.0", "M")
+    results = asyncio.run(cache.get_many(["memory", "stored", "missing"], "en", "hi", "1.0"))
+    assert results == ["M", "S", None]
+    assert cache.store_hits == 1
+
+
+def test_model_version_is_part_of_the_key():
+    cache = TranslationCache(path="")
+    cache.set("hello", "en", "hi", "1.0", "old")
+    assert asyncio.run(cache.get_many(["hello"], "en", "hi", "2.0")) == [None]
+    cache.flush()
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("requests")
+
+from test_hindi import AsyncTranslationClient, TranslationRejected
+
+
+def half_open(client):
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout
+
+
+def test_cancelled_trial_releases_half_open_breaker():
+    client = AsyncTranslationClient(retries=0)
+    half_open(client)
+
+    async def hang(path, payload):
+        await asyncio.Event().wait()
+
+    client._post = hang
+
+    async def run():
+        task = asyncio.create_task(client.translate_texts(["cancelled"], "en", "hi"))
+        await asyncio.sleep(0)
+        assert client.breaker.trial_in_flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not client.breaker.trial_in_flight
+    assert client.breaker.state == "half-open"
+
+    async def ok(path, payload):
+        return {"translated_texts": ["अनुवाद"]}
+
+    client._post = ok
+    assert asyncio.run(client.translate_texts(["recovered"], "en", "hi")) == ["अनुवाद"]
+    assert client.breaker.state == "closed"
+
+
+def test_rejected_requests_do_not_open_breaker():
+    client = AsyncTranslationClient(retries=0)
+
+    async def reject(path, payload):
+        raise TranslationRejected("404: unknown pair")
+
+    client._post = reject
+    for i in range(client.breaker.failure_threshold + 1):
+        assert asyncio.run(client.translate_texts([f"text {i}"], "en", "xx")) == [f"text {i}"]
+    assert client.breaker.state == "closed"
+    assert client.breaker.failures == 0
+
+
+def test_failures_open_breaker():
+    client = AsyncTranslationClient(retries=0)
+
+    async def down(path, payload):
+        raise __import__("httpx").ConnectError("connection refused")
+
+    client._post = down
+    for i in range(client.breaker.failure_threshold):
+        asyncio.run(client.translate_texts([f"text {i}"], "en", "hi"))
+    assert client.breaker.state == "open"
@@ -0,0 +1,21 @@
+import pytest
+
+# Importing translator builds the default (remote) translator
+pytest.importorskip("httpx")
+pytest.importorskip("requests")
+
+from translator import normalize_language
+
+
+def test_normalize_language_accepts_variants():
+    assert normalize_language("hi") == "hi"
+    assert normalize_language("EN") == "en"
+    assert normalize_language("en-US") == "en"
+    assert normalize_language("hi_IN") == "hi"
+
+
+def test_normalize_language_falls_back_to_english():
+    assert normalize_language(None) == "en"
+    assert normalize_language("") == "en"
+    assert normalize_language("xx") == "en"
+    assert normalize_language("hi", supported=["en"]) == "en"
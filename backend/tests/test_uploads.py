@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+try:
+    import python_multipart  # noqa: F401
+except ModuleNotFoundError:
+    pytest.importorskip("multipart")
+
+from uploads import (
+    StreamingFormParser, TooManyFilesError, UploadTooLargeError, MalformedFormError, MAX_FIELD_BYTES
+)
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def form_body(fields=(), files=()):
+    body = b""
+    for name, value in fields:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                 f"{value}\r\n").encode("utf-8")
+    for name, filename, data in files:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; "
+                 f"filename=\"{filename}\"\r\nContent-Type: image/jpeg\r\n\r\n").encode("utf-8")
+        body += data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode("utf-8")
+
+
+def parse(body, max_file_bytes=100, max_files=2, max_body_bytes=10_000, chunk=7):
+    async def chunks():
+        for i in range(0, len(body), chunk):
+            yield body[i:i + chunk]
+
+    parser = StreamingFormParser(CONTENT_TYPE, max_file_bytes, max_files, max_body_bytes)
+    return asyncio.run(parser.parse(chunks()))
+
+
+def test_fields_and_files_are_read_into_memory():
+    form = parse(form_body(
+        fields=[("aadhar", "123412341234"), ("language", "hi")],
+        files=[("files", "a.jpg", b"\xff\xd8first"), ("files", "b.jpg", b"\xff\xd8second")]
+    ))
+    assert form.get("aadhar") == "123412341234"
+    assert form.get("language") == "hi"
+    assert [(f.filename, f.data) for f in form.files_for("files")] == [
+        ("a.jpg", b"\xff\xd8first"), ("b.jpg", b"\xff\xd8second")
+    ]
+
+
+def test_oversized_file_is_marked_and_not_buffered():
+    form = parse(form_body(files=[("files", "big.jpg", b"x" * 500), ("files", "ok.jpg", b"small")]))
+    big, ok = form.files
+    assert big.too_large and big.size == 500
+    assert not ok.too_large and ok.data == b"small"
+
+
+def test_body_over_the_cap_stops_the_upload():
+    with pytest.raises(UploadTooLargeError):
+        parse(form_body(files=[("file", "a.jpg", b"x" * 500)]), max_body_bytes=200)
+
+
+def test_too_many_files_are_rejected():
+    files = [("files", f"{i}.jpg", b"x") for i in range(3)]
+    with pytest.raises(TooManyFilesError):
+        parse(form_body(files=files), max_files=2)
+
+
+def test_oversized_field_is_rejected():
+    with pytest.raises(UploadTooLargeError):
+        parse(form_body(fields=[("aadhar", "1" * (MAX_FIELD_BYTES + 1))]), max_body_bytes=10 * MAX_FIELD_BYTES)
+
+
+def test_non_multipart_body_is_rejected():
+    with pytest.raises(MalformedFormError):
+        StreamingFormParser("application/json", 100, 1, 1000)
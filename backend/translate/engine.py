@@ -0,0 +1,271 @@
+import glob
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import (
+    TRANSLATE_PAIRS, ARGOS_PACKAGE_DIR, ARGOS_ALLOW_DOWNLOAD, TRANSLATE_WORKERS,
+    TRANSLATE_MEMORY_BUDGET_MB
+)
+
+# CTranslate2 runs one batch at a time unless Argos is given more inter-op
+# threads, which must be set before argostranslate reads its settings
+os.environ.setdefault("ARGOS_INTER_THREADS", str(TRANSLATE_WORKERS))
+
+import argostranslate.package
+import argostranslate.translate
+
+from translate.segmenter import split_text, join_text
+
+logger = logging.getLogger(__name__)
+
+
+def parse_pairs(spec):
+    """'en-hi,hi-en' -> [('en', 'hi'), ('hi', 'en')]"""
+    return [tuple(pair.strip().split("-", 1)) for pair in spec.split(",") if pair.strip()]
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class PivotTranslation:
+    """Chains two translations, e.g. ta->en followed by en->kn."""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def translate(self, text):
+        return self.second.translate(self.first.translate(text))
+
+
+class TranslationEngine:
+    """Registry of Argos language pairs, loaded lazily and kept under a memory budget.
+
+    A pair is installed and loaded the first time it is requested: from the
+    already-installed packages, then ``package_dir`` (``*.argosmodel`` files,
+    for offline hosts), then a download if ``allow_download`` is set. Loaded
+    pairs stay resident in LRU order and the least recently used ones are
+    unloaded once their combined model size exceeds ``memory_budget_mb``.
+    Pairs without a direct package are served by pivoting through English.
+    Installing and loading happen outside the registry lock, so a slow
+    download never holds up translations with pairs that are already loaded;
+    concurrent requests for the pair being loaded wait for the same load.
+    """
+
+    def __init__(self, pairs=None, package_dir=ARGOS_PACKAGE_DIR, allow_download=ARGOS_ALLOW_DOWNLOAD,
+                 workers=TRANSLATE_WORKERS, memory_budget_mb=TRANSLATE_MEMORY_BUDGET_MB):
+        self.pairs = pairs if pairs is not None else parse_pairs(TRANSLATE_PAIRS)
+        self.package_dir = package_dir
+        self.allow_download = allow_download
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        # (from_code, to_code) -> (translation, size in bytes), least recently used first
+        self.translations = OrderedDict()
+        self.versions = {}
+        self.errors = {}
+        self.loads = 0
+        self.evictions = 0
+        self._available = None
+        # Guards translations/versions/errors/_loading; never held during I/O
+        self._lock = threading.Lock()
+        # Serializes package index updates and installs
+        self._install_lock = threading.Lock()
+        # (from_code, to_code) -> Future of the load in progress
+        self._loading = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate")
+
+    def load(self):
+        """Preload the configured pairs (e.g. at startup); returns the ready pairs."""
+        for from_code, to_code in self.pairs:
+            try:
+                self.get(from_code, to_code)
+            except KeyError:
+                pass
+        return self.ready_pairs()
+
+    def get(self, from_code, to_code):
+        """Return a translation for the pair, loading (or pivoting) it on first use.
+
+        Raises KeyError if the pair cannot be served.
+        """
+        key = (from_code, to_code)
+        with self._lock:
+            if key in self.translations:
+                self.translations.move_to_end(key)
+                return self.translations[key][0]
+            future = self._loading.get(key)
+            loading_here = future is None
+            if loading_here:
+                future = self._loading[key] = Future()
+        if not loading_here:
+            return future.result()
+        try:
+            translation = self._load(from_code, to_code)
+            future.set_result(translation)
+            return translation
+        except Exception as e:
+            # Wake the requests waiting on this load too
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def _load(self, from_code, to_code):
+        key = (from_code, to_code)
+        try:
+            translation = self._load_pair(from_code, to_code)
+        except Exception as e:
+            if "en" in key:
+                with self._lock:
+                    self.errors[key] = str(e)
+                logger.error(f"Translation pair {from_code}->{to_code} not loaded: {str(e)}")
+                raise KeyError(f"Translation pair {from_code}->{to_code} is not available")
+            # No direct package: go through English
+            translation = self._load_pivot(from_code, to_code)
+        with self._lock:
+            self.errors.pop(key, None)
+        return translation
+
+    def version(self, from_code, to_code):
+        """Model version of the pair, loading it first if needed (KeyError if unavailable)."""
+        self.get(from_code, to_code)
+        return self.versions.get((from_code, to_code))
+
+    def _load_pivot(self, from_code, to_code):
+        translation = PivotTranslation(self.get(from_code, "en"), self.get("en", to_code))
+        key = (from_code, to_code)
+        with self._lock:
+            # The pivot owns no model memory of its own
+            self.translations[key] = (translation, 0)
+            self.versions[key] = f"{self.versions.get((from_code, 'en'))}+{self.versions.get(('en', to_code))}"
+        logger.info(f"Translation pair {from_code}->{to_code} pivots through English")
+        return translation
+
+    def _installed_package(self, from_code, to_code):
+        for package in argostranslate.package.get_installed_packages():
+            if package.from_code == from_code and package.to_code == to_code:
+                return package
+        return None
+
+    def _install(self, from_code, to_code):
+        if self.package_dir:
+            pattern = os.path.join(self.package_dir, f"*{from_code}_{to_code}*.argosmodel")
+            for path in sorted(glob.glob(pattern)):
+                logger.info(f"Installing {from_code}->{to_code} from {path}")
+                argostranslate.package.install_from_path(path)
+                return
+        if not self.allow_download:
+            raise RuntimeError("package not installed and downloads are disabled")
+        if self._available is None:
+            argostranslate.package.update_package_index()
+            self._available = argostranslate.package.get_available_packages()
+        package = next(
+            (p for p in self._available if p.from_code == from_code and p.to_code == to_code),
+            None
+        )
+        if package is None:
+            raise RuntimeError("no Argos package available for this pair")
+        logger.info(f"Downloading {from_code}->{to_code} package")
+        argostranslate.package.install_from_path(package.download())
+
+    def _load_pair(self, from_code, to_code):
+        package = self._installed_package(from_code, to_code)
+        if package is None:
+            with self._install_lock:
+                self._install(from_code, to_code)
+            package = self._installed_package(from_code, to_code)
+        if package is None:
+            raise RuntimeError("package did not install")
+        languages = {lang.code: lang for lang in argostranslate.translate.get_installed_languages()}
+        if from_code not in languages or to_code not in languages:
+            raise RuntimeError("language not installed")
+        translation = languages[from_code].get_translation(languages[to_code])
+        if translation is None:
+            raise RuntimeError("no translation between installed languages")
+        size = _directory_bytes(str(package.package_path))
+        key = (from_code, to_code)
+        with self._lock:
+            self._make_room(size)
+            self.translations[key] = (translation, size)
+            self.versions[key] = getattr(package, "package_version", None)
+            self.loads += 1
+        logger.info(f"Translation pair {from_code}->{to_code} ready ({size / 2**20:.0f} MiB)")
+        return translation
+
+    def _make_room(self, size):
+        # Called with self._lock held
+        while self.translations and self.memory_used() + size > self.memory_budget:
+            key, (translation, _) = self.translations.popitem(last=False)
+            # Pivots built on the evicted pair must be dropped with it
+            for other in [k for k, (t, _) in self.translations.items()
+                          if isinstance(t, PivotTranslation) and translation in (t.first, t.second)]:
+                del self.translations[other]
+            # Argos creates the CTranslate2 model lazily; dropping it frees the memory
+            if hasattr(translation, "translator"):
+                translation.translator = None
+            self.evictions += 1
+            logger.info(f"Unloaded translation pair {key[0]}->{key[1]} to stay within the memory budget")
+
+    def memory_used(self):
+        return sum(size for _, size in list(self.translations.values()))
+
+    def is_ready(self, from_code, to_code):
+        return (from_code, to_code) in self.translations
+
+    def ready_pairs(self):
+        return [f"{f}-{t}" for f, t in list(self.translations)]
+
+    def translate(self, text, from_code="en", to_code="hi"):
+        return self.translate_batch([text], from_code, to_code)[0]
+
+    def translate_batch(self, texts, from_code="en", to_code="hi"):
+        """Translate a list of texts with one language pair.
+
+        Every text is split into sentences (keeping its markdown/list layout),
+        the distinct sentences of the whole batch are translated in parallel on
+        the worker pool and each text is reassembled in order.
+        """
+        if from_code == to_code:
+            return list(texts)
+        translation = self.get(from_code, to_code)
+        splits = [split_text(text) for text in texts]
+        unique = list(dict.fromkeys(s for _, sentences in splits for s in sentences))
+        translated = dict(zip(unique, self._pool.map(translation.translate, unique)))
+        return [
+            join_text(layout, [translated[s] for s in sentences])
+            for layout, sentences in splits
+        ]
+
+    def status(self):
+        pairs = {}
+        with self._lock:
+            keys = list(dict.fromkeys(list(self.pairs) + list(self.translations) + list(self.errors)))
+        for key in keys:
+            loaded = self.translations.get(key)
+            pairs[f"{key[0]}-{key[1]}"] = {
+                "ready": loaded is not None,
+                "pivot": loaded is not None and isinstance(loaded[0], PivotTranslation),
+                "size_bytes": loaded[1] if loaded is not None else None,
+                "version": self.versions.get(key),
+                "error": self.errors.get(key),
+            }
+        return pairs
+
+    def stats(self):
+        return {
+            "memory_used_bytes": self.memory_used(),
+            "memory_budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,34 @@
+import re
+
+# Markdown structure kept out of the text sent to the model
+LINE_PREFIX = re.compile(r"^(\s*(?:[-*+]|\d+[.)]|#{1,6}|>)\s+|\s+)")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?।])\s+")
+
+
+def split_text(text):
+    """Split text into sentences while remembering its line structure.
+
+    Returns ``(layout, sentences)`` where ``layout`` holds one
+    ``(prefix, sentence_count)`` entry per line; list markers, headings and
+    indentation stay in the prefix and blank lines have a count of 0.
+    """
+    layout = []
+    sentences = []
+    for line in text.split("\n"):
+        match = LINE_PREFIX.match(line)
+        prefix = match.group(0) if match else ""
+        body = line[len(prefix):].strip()
+        parts = [part for part in SENTENCE_BREAK.split(body) if part] if body else []
+        layout.append((prefix, len(parts)))
+        sentences.extend(parts)
+    return layout, sentences
+
+
+def join_text(layout, sentences):
+    """Rebuild text from split_text's layout and (translated) sentences."""
+    lines = []
+    position = 0
+    for prefix, count in layout:
+        lines.append(prefix + " ".join(sentences[position:position + count]))
+        position += count
+    return "\n".join(lines)
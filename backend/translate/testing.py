@@ -11,24 +11,24 @@ def call_hindi(text, from_code="en"):
         print("Hindi response not JSON:", response.text)
 
 def call_tamil(text, from_code="en"):
-    payload = {"text": text, "from_code": from_code, "to_code": "ta"}
-    response = requests.post(f"{BASE_URL}/tamil", json=payload)
+    payload = {"text": text}
+    response = requests.post(f"{BASE_URL}/translate/{from_code}/ta", json=payload)
     try:
         print("Tamil:", response.json())
     except ValueError:
         print("Tamil response not JSON:", response.text)
 
 def call_telugu(text, from_code="en"):
-    payload = {"text": text, "from_code": from_code, "to_code": "te"}
-    response = requests.post(f"{BASE_URL}/telugu", json=payload)
+    payload = {"text": text}
+    response = requests.post(f"{BASE_URL}/translate/{from_code}/te", json=payload)
     try:
         print("Telugu:", response.json())
     except ValueError:
         print("Telugu response not JSON:", response.text)
 
 def call_kannada(text, from_code="en"):
-    payload = {"text": text, "from_code": from_code, "to_code": "kn"}
-    response = requests.post(f"{BASE_URL}/kannada", json=payload)
+    payload = {"text": text}
+    response = requests.post(f"{BASE_URL}/translate/{from_code}/kn", json=payload)
     try:
         print("Kannada:", response.json())
     except ValueError:
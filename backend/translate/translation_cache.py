@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from cache import LRUCache
+from config import TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL, TRANSLATION_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """Memoizes translations keyed by (text, from_code, to_code, model_version).
+
+    Lookups hit an in-process LRU first and then an optional SQLite store that
+    can be shared by the translation service and its clients on one host.
+    Writes to the store happen behind ``set`` on a background thread, in
+    batches; async callers read it with ``get_many``, which runs the store
+    lookups for a whole batch in one executor call. Neither blocks the event loop.
+    """
+
+    def __init__(self, maxsize=TRANSLATION_CACHE_SIZE, ttl=TRANSLATION_CACHE_TTL,
+                 path=TRANSLATION_CACHE_PATH):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.path = path
+        self.store_hits = 0
+        self._db = None
+        self._lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "text TEXT NOT NULL, from_code TEXT NOT NULL, to_code TEXT NOT NULL, "
+                    "model_version TEXT NOT NULL, translated TEXT NOT NULL, created_at REAL NOT NULL, "
+                    "PRIMARY KEY (text, from_code, to_code, model_version))"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Translation cache store at {path} disabled: {str(e)}")
+                self._db = None
+        if self._db is not None:
+            self._writer = threading.Thread(target=self._write_rows, name="translation-cache", daemon=True)
+            self._writer.start()
+
+    def get(self, text, from_code, to_code, model_version):
+        key = (text, from_code, to_code, model_version or "")
+        translated = self.memory.get(key)
+        if translated is None and self._db is not None:
+            translated = self._load(key)
+            if translated is not None:
+                self.store_hits += 1
+                self.memory.set(key, translated)
+        return translated
+
+    async def get_many(self, texts, from_code, to_code, model_version):
+        """Cached translation for each text (None where missing), without blocking the loop."""
+        keys = [(text, from_code, to_code, model_version or "") for text in texts]
+        results = [self.memory.get(key) for key in keys]
+        missing = [key for key, result in zip(keys, results) if result is None]
+        if missing and self._db is not None:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, self._load_many, missing)
+            for key, translated in loaded.items():
+                self.store_hits += 1
+                self.memory.set(key, translated)
+            results = [loaded.get(key) if result is None else result for key, result in zip(keys, results)]
+        return results
+
+    def set(self, text, from_code, to_code, model_version, translated):
+        """Remember a translation; the store write is queued, never waited for."""
+        key = (text, from_code, to_code, model_version or "")
+        self.memory.set(key, translated)
+        if self._db is not None:
+            self._writes.put(key + (translated, time.time()))
+
+    def flush(self):
+        """Wait until every queued store write has been committed."""
+        if self._db is not None:
+            self._writes.join()
+
+    def _write_rows(self):
+        while True:
+            rows = [self._writes.get()]
+            # Commit everything queued so far in one transaction
+            while True:
+                try:
+                    rows.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._lock:
+                    self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist {len(rows)} translations: {str(e)}")
+            finally:
+                for _ in rows:
+                    self._writes.task_done()
+
+    def _load_many(self, keys):
+        loaded = {}
+        for key in keys:
+            translated = self._load(key)
+            if translated is not None:
+                loaded[key] = translated
+        return loaded
+
+    def _load(self, key):
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT translated, created_at FROM translations "
+                    "WHERE text = ? AND from_code = ? AND to_code = ? AND model_version = ?",
+                    key
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read translation cache: {str(e)}")
+            return None
+        if row is None or (self.ttl and row[1] + self.ttl < time.time()):
+            return None
+        return row[0]
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update({
+            "store": self.path or None,
+            "store_hits": self.store_hits,
+        })
+        return stats
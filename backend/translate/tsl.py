@@ -1,37 +1,103 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from pydantic import BaseModel
-import argostranslate.package
-import argostranslate.translate
+from typing import List
 from fastapi.responses import FileResponse
+from translate.engine import TranslationEngine
+from translate.translation_cache import TranslationCache
+import logging
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
+# Language pairs are loaded once on first use (or at startup) and kept resident
+engine = TranslationEngine()
+translation_cache = TranslationCache()
+
+# Argos/ISO 639 language codes, e.g. "hi" or "ast"
+LANGUAGE_CODE = re.compile(r"[a-z]{2,3}")
+
 class TranslateRequest(BaseModel):
     text: str
     from_code: str
     to_code: str 
 
+class TextRequest(BaseModel):
+    text: str
+
+class BatchTranslateRequest(BaseModel):
+    texts: List[str]
+    from_code: str
+    to_code: str
+
+@app.on_event("startup")
+def load_translation_engine():
+    ready = engine.load()
+    logger.info(f"Translation pairs ready: {', '.join(ready) or 'none'}")
+
+def translate_texts(texts, from_code="en", to_code="hi"):
+    """Translate a list of texts, serving cached ones and running the rest in one engine call."""
+    for code in (from_code, to_code):
+        if not LANGUAGE_CODE.fullmatch(code or ""):
+            raise HTTPException(status_code=400, detail=f"Invalid language code '{code}'")
+    try:
+        # Loads the pair (or its English pivot) on first use
+        version = engine.version(from_code, to_code)
+    except KeyError as e:
+        # The service is up, it just can't serve this pair; clients must not retry it
+        raise HTTPException(status_code=404, detail=str(e))
+    results = [translation_cache.get(text, from_code, to_code, version) for text in texts]
+    missing = [text for text, result in zip(texts, results) if result is None]
+    if missing:
+        translated = dict(zip(missing, engine.translate_batch(missing, from_code, to_code)))
+        for text, result in translated.items():
+            translation_cache.set(text, from_code, to_code, version, result)
+        results = [translated[text] if result is None else result for text, result in zip(texts, results)]
+    return results
+
 def translate_text(text, from_code="en", to_code="hi"):
-    argostranslate.package.update_package_index()
-    available_packages = argostranslate.package.get_available_packages()
-    package_to_install = next(
-        filter(
-            lambda x: x.from_code == from_code and x.to_code == to_code,
-            available_packages,
-        )
-    )
-    argostranslate.package.install_from_path(package_to_install.download())
-    translated_text = argostranslate.translate.translate(text, from_code, to_code)
-    return translated_text
+    return translate_texts([text], from_code, to_code)[0]
+
+def translation_response(text, from_code, to_code):
+    result = translate_text(text, from_code, to_code)
+    return {
+        "translated_text": result,
+        "model_version": engine.versions.get((from_code, to_code))
+    }
 
+@app.post("/translate/batch")
+def translate_batch(req: BatchTranslateRequest):
+    results = translate_texts(req.texts, req.from_code, req.to_code)
+    return {
+        "translated_texts": results,
+        "model_version": engine.versions.get((req.from_code, req.to_code))
+    }
+
+@app.post("/translate/{from_code}/{to_code}")
+def translate_pair(from_code: str, to_code: str, req: TextRequest):
+    return translation_response(req.text, from_code, to_code)
+
+# Kept for existing clients; equivalent to /translate/{from_code}/{to_code}
 @app.post("/hindi")
 def translate(req: TranslateRequest,to_code = "hi", from_code: str = "en"):
-    result = translate_text(req.text, req.from_code, req.to_code)
-    return {"translated_text": result}
+    return translation_response(req.text, req.from_code, req.to_code)
 
 @app.post("/english")
 def translate(req: TranslateRequest,to_code = "en", from_code: str = "hi"):
-    result = translate_text(req.text, req.from_code, req.to_code)
-    return {"translated_text": result}
+    return translation_response(req.text, req.from_code, req.to_code)
+
+@app.get("/health")
+def health():
+    pairs = engine.status()
+    ready = all(pair["ready"] for key, pair in pairs.items() if tuple(key.split("-", 1)) in engine.pairs)
+    return {
+        "status": "ok" if ready else "degraded",
+        "pairs": pairs,
+        "memory": engine.stats(),
+        "cache": translation_cache.stats()
+    }
 
 @app.get("/map")
 async def serve_map():
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TRANSLATOR_MODE, CHAT_LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+TRANSLATOR_MODES = ("remote", "inprocess")
+
+
+def normalize_language(language, supported=CHAT_LANGUAGES):
+    """Map a client language ('EN', 'en-US', 'hi_IN', None) to a supported code.
+
+    Unsupported or missing languages fall back to English so they never reach
+    the translator.
+    """
+    code = (language or "en").strip().lower().replace("_", "-").split("-", 1)[0]
+    if code in supported:
+        return code
+    logger.warning(f"Unsupported chat language '{language}', answering in English")
+    return "en"
+
+
+class Translator:
+    """Interface used by the chatbot and label tooling to translate text.
+
+    Implementations never raise for translation failures; they return the
+    untranslated text instead so callers can always continue in English.
+    """
+
+    name = None
+
+    async def start(self):
+        pass
+
+    async def translate_texts(self, texts, from_code="hi", to_code="en"):
+        raise NotImplementedError
+
+    async def translate(self, text, from_code="en", to_code="hi"):
+        return (await self.translate_texts([text], from_code, to_code))[0]
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {"mode": self.name}
+
+
+class RemoteTranslator(Translator):
+    """Calls the translation service on port 8100 through the pooled async client."""
+
+    name = "remote"
+
+    def __init__(self, client=None):
+        from test_hindi import translation_client, translation_cache
+
+        self.client = client if client is not None else translation_client
+        self.cache = translation_cache
+
+    async def translate_texts(self, texts, from_code="hi", to_code="en"):
+        return await self.client.translate_texts(texts, from_code, to_code)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self):
+        return dict(super().stats(), client=self.client.stats(), cache=self.cache.stats())
+
+
+class InProcessTranslator(Translator):
+    """Loads the Argos models into this process; no HTTP hop or second service.
+
+    Translation runs on a dedicated thread pool (CTranslate2 releases the GIL)
+    so the event loop is never blocked.
+    """
+
+    name = "inprocess"
+
+    def __init__(self, engine=None, cache=None, threads=2):
+        from translate.engine import TranslationEngine
+        from translate.translation_cache import TranslationCache
+
+        self.engine = engine if engine is not None else TranslationEngine()
+        self.cache = cache if cache is not None else TranslationCache()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="translator")
+        self.failures = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        ready = await loop.run_in_executor(self._executor, self.engine.load)
+        logger.info(f"In-process translation pairs ready: {', '.join(ready) or 'none'}")
+
+    async def translate_texts(self, texts, from_code="hi", to_code="en"):
+        loop = asyncio.get_running_loop()
+        try:
+            # Loads the pair on first use
+            version = await loop.run_in_executor(self._executor, self.engine.version, from_code, to_code)
+        except KeyError as e:
+            self.failures += 1
+            logger.error(f"Translation {from_code}->{to_code} unavailable, using original text: {str(e)}")
+            return list(texts)
+        results = await self.cache.get_many(texts, from_code, to_code, version)
+        missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if not missing:
+            return results
+        try:
+            translated = await loop.run_in_executor(
+                self._executor, self.engine.translate_batch, missing, from_code, to_code
+            )
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Translation {from_code}->{to_code} failed, using original text: {str(e)}")
+            return [text if r is None else r for text, r in zip(texts, results)]
+        translated = dict(zip(missing, translated))
+        for text, result in translated.items():
+            self.cache.set(text, from_code, to_code, version, result)
+        return [translated[text] if r is None else r for text, r in zip(texts, results)]
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return dict(
+            super().stats(),
+            pairs=self.engine.status(),
+            memory=self.engine.stats(),
+            cache=self.cache.stats(),
+            failures=self.failures
+        )
+
+
+def create_translator(mode=TRANSLATOR_MODE):
+    if mode == "remote":
+        return RemoteTranslator()
+    if mode == "inprocess":
+        return InProcessTranslator()
+    raise ValueError(f"Unknown translator mode '{mode}', expected one of {', '.join(TRANSLATOR_MODES)}")
+
+
+translator = create_translator()
@@ -0,0 +1,178 @@
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    # python-multipart before 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# Text form fields (aadhar, language, ...) are tiny; anything bigger is not a form we expect
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when the request body is larger than any accepted upload."""
+
+
+class TooManyFilesError(Exception):
+    """Raised when a form carries more files than the endpoint accepts."""
+
+
+class MalformedFormError(Exception):
+    """Raised when the body is not a multipart form."""
+
+
+class UploadedImage:
+    """One file part, held in memory.
+
+    ``data`` is None when the file went over the size cap; its bytes were
+    dropped as they arrived instead of being buffered.
+    """
+
+    def __init__(self, field, filename, content_type):
+        self.field = field
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.data = bytearray()
+
+    @property
+    def too_large(self):
+        return self.data is None
+
+
+class UploadForm:
+    """Text fields and files of a multipart form."""
+
+    def __init__(self):
+        self.fields = {}
+        self.files = []
+
+    def get(self, name, default=None):
+        return self.fields.get(name, default)
+
+    def files_for(self, field):
+        return [upload for upload in self.files if upload.field == field]
+
+
+class StreamingFormParser:
+    """Parses a multipart body chunk by chunk, keeping every part in memory.
+
+    Starlette's form parser spools files to temporary files and only lets the
+    endpoint look at them once the whole body has arrived. This one is fed
+    ``request.stream()`` directly: a file part over ``max_file_bytes`` is
+    marked too large and its remaining bytes discarded, more than
+    ``max_files`` files or a body over ``max_body_bytes`` stop the upload
+    with an error as soon as they are seen, and nothing touches the disk.
+    """
+
+    def __init__(self, content_type, max_file_bytes, max_files, max_body_bytes):
+        media_type, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise MalformedFormError("Expected a multipart/form-data body")
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_body_bytes = max_body_bytes
+        self.form = UploadForm()
+        self.received = 0
+        self._error = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part = None
+        self._field = None
+        self._value = bytearray()
+        self._parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def parse(self, chunks):
+        """Consume an async iterator of body chunks and return the UploadForm."""
+        async for chunk in chunks:
+            self.received += len(chunk)
+            if self.received > self.max_body_bytes:
+                raise UploadTooLargeError("Request body too large")
+            self._parser.write(chunk)
+            # Callbacks cannot raise through the parser cleanly; surface their errors here
+            if self._error is not None:
+                raise self._error
+        self._parser.finalize()
+        if self._error is not None:
+            raise self._error
+        return self.form
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._part = None
+        self._field = None
+        self._value = bytearray()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._field = name
+            return
+        if len(self.form.files) >= self.max_files:
+            self._error = self._error or TooManyFilesError(f"At most {self.max_files} files per request")
+            return
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1")
+        self._part = UploadedImage(name, options[b"filename"].decode("utf-8", "replace"), content_type)
+        self.form.files.append(self._part)
+
+    def _on_part_data(self, data, start, end):
+        size = end - start
+        part = self._part
+        if part is not None:
+            part.size += size
+            if part.too_large:
+                return
+            if part.size > self.max_file_bytes:
+                part.data = None
+                return
+            part.data += data[start:end]
+        elif self._field is not None:
+            if len(self._value) + size > MAX_FIELD_BYTES:
+                self._error = self._error or UploadTooLargeError(f"Form field {self._field} too large")
+                return
+            self._value += data[start:end]
+
+    def _on_part_end(self):
+        if self._part is not None and not self._part.too_large:
+            self._part.data = bytes(self._part.data)
+        elif self._field is not None and self._error is None:
+            self.form.fields[self._field] = self._value.decode("utf-8", "replace")
+        self._part = None
+        self._field = None
+
+
+async def read_upload_form(request, max_file_bytes, max_files):
+    """Parse a multipart upload from ``request`` under the size caps.
+
+    Raises UploadTooLargeError before reading anything when Content-Length
+    already exceeds the body cap, and while streaming otherwise.
+    """
+    max_body_bytes = max_files * max_file_bytes + MAX_FIELD_BYTES
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_body_bytes:
+        raise UploadTooLargeError("Request body too large")
+    parser = StreamingFormParser(request.headers.get("content-type"), max_file_bytes, max_files, max_body_bytes)
+    return await parser.parse(request.stream())